@@ -0,0 +1,135 @@
+"""Performance regression gate: compare the benchmark suite against a stored baseline.
+
+Usage:
+    python bench_compare.py [--baseline PATH] [--tolerance 0.25] [--min-delta-ms 1.0]
+                            [--repeat N] [--current PATH] [--metric NAME ...] [--update]
+
+Runs the bench_freq_image suite (or loads a previous --json report with
+--current), compares each measurement with the baseline and exits with
+status 1 if any of them is slower than the baseline by more than the
+tolerance. --update overwrites the baseline with the current run instead;
+commit it when a change is meant to move the numbers.
+
+The gate compares min_ms by default: the fastest sample is what the code
+costs when the host leaves it alone, and it is the statistic that repeats
+between runs of unchanged code (within about 20% on a shared single-CPU
+host, where medians moved by up to 70% from one run to the next). Gate on
+median_ms too with --metric on a quiet, dedicated host. p95_ms is only
+compared for measurements with at least P95_MIN_SAMPLES samples on both
+sides: below that it is just the slowest sample.
+"""
+import argparse
+import json
+import sys
+
+import bench_freq_image as bench
+
+
+DEFAULT_BASELINE = "bench_baseline.json"
+METRIC_CHOICES = ("min_ms", "median_ms", "p95_ms")
+DEFAULT_METRICS = ("min_ms",)
+# Below this many samples the nearest-rank p95 is the maximum, i.e. noise.
+P95_MIN_SAMPLES = 20
+
+
+def compare(baseline, current, tolerance, min_delta_ms, metrics=DEFAULT_METRICS):
+    """Compare two result dicts ({name: stats}) on metrics.
+
+    Returns a list of (name, metric, baseline_ms, current_ms, status) rows.
+    status is "regression" when current exceeds baseline by more than
+    tolerance (a ratio) and by more than min_delta_ms, "improvement" for the
+    symmetric case, "ok" otherwise, and "missing"/"new" for measurements
+    present on only one side.
+    """
+    rows = []
+    for name in sorted(baseline.keys() | current.keys()):
+        if name not in current:
+            rows.append((name, None, None, None, "missing"))
+            continue
+        if name not in baseline:
+            rows.append((name, None, None, None, "new"))
+            continue
+        samples = min(baseline[name].get("samples", 0), current[name].get("samples", 0))
+        for metric in metrics:
+            before = baseline[name].get(metric)
+            after = current[name].get(metric)
+            if before is None or after is None or (metric == "p95_ms" and samples < P95_MIN_SAMPLES):
+                continue
+            delta = after - before
+            if delta > before * tolerance and delta > min_delta_ms:
+                status = "regression"
+            elif -delta > before * tolerance and -delta > min_delta_ms:
+                status = "improvement"
+            else:
+                status = "ok"
+            rows.append((name, metric, before, after, status))
+    return rows
+
+
+def print_rows(rows, verbose=False, file=sys.stdout):
+    """Print changed rows (every row with verbose=True), one line each."""
+    for name, metric, before, after, status in rows:
+        if status == "ok" and not verbose:
+            continue
+        if metric is None:
+            print(f"{status.upper():<12} {name}", file=file)
+            continue
+        change = (after - before) / before * 100 if before else float("inf")
+        print(f"{status.upper():<12} {name:<36} {metric:<9} {before:10.3f} ms -> {after:10.3f} ms  "
+              f"({change:+.1f}%)", file=file)
+
+
+def load_report(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help=f"Baseline JSON (default {DEFAULT_BASELINE})")
+    parser.add_argument("--current", metavar="PATH", help="Compare this bench_freq_image --json report "
+                                                          "instead of running the suite")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown as a ratio of the baseline (default 0.25, i.e. 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="Ignore differences smaller than this many milliseconds (default 1.0)")
+    parser.add_argument("--repeat", type=int, default=P95_MIN_SAMPLES,
+                        help=f"Iterations per measurement (default {P95_MIN_SAMPLES}, enough to gate on p95)")
+    parser.add_argument("--metric", action="append", choices=METRIC_CHOICES,
+                        help="Statistic to gate on; can be repeated (default min_ms). "
+                             f"p95_ms is skipped below {P95_MIN_SAMPLES} samples")
+    parser.add_argument("--update", action="store_true", help="Write the current run as the new baseline")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Also print unchanged measurements")
+    args = parser.parse_args()
+
+    if args.current:
+        report = load_report(args.current)
+    else:
+        report = {"environment": bench.environment(), "repeat": args.repeat,
+                  "results": bench.run_benchmarks(args.repeat)}
+
+    if args.update:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline} ({len(report['results'])} measurements)")
+        return
+
+    baseline = load_report(args.baseline)
+    print(f"Baseline: commit {baseline['environment'].get('commit')}, Pillow {baseline['environment'].get('pillow')}, "
+          f"{baseline['environment'].get('platform')}")
+    print(f"Current:  commit {report['environment'].get('commit')}, Pillow {report['environment'].get('pillow')}, "
+          f"{report['environment'].get('platform')}")
+    metrics = tuple(args.metric) if args.metric else DEFAULT_METRICS
+    rows = compare(baseline["results"], report["results"], args.tolerance, args.min_delta_ms, metrics)
+    print_rows(rows, args.verbose)
+
+    regressions = sum(1 for row in rows if row[4] in ("regression", "missing"))
+    improvements = sum(1 for row in rows if row[4] == "improvement")
+    print(f"{len(rows)} comparisons, {regressions} regressions, {improvements} improvements "
+          f"(tolerance {args.tolerance:.0%}, min delta {args.min_delta_ms} ms)")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
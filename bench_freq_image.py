@@ -0,0 +1,485 @@
+"""Headless benchmarks for freq_image_gen.
+
+Usage:
+    python bench_freq_image.py [--repeat N] [--only NAME ...] [--all] [--json PATH]
+
+By default the suite (helpers and card scenarios) runs; --all adds the
+slower comparison benchmarks (batch, threads, executors...). --json writes
+the results with environment metadata so runs can be compared across
+commits ("-" for stdout).
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import PIL
+from PIL import Image, ImageDraw
+
+import freq_image_gen as fig
+from freq_image_batch import RenderPool
+
+ASSETS_DIR = "assets"
+
+EXAMPLE_CARD = dict(
+    frequency="97.3",
+    scene_genre="House solaire",
+    scene_name="L'Atrium",
+    radio_station_name="House solaire et organique",
+    verbatims=["Open-air au coucher du soleil", "Flottant et groovy"],
+    tags=["Défensif", "Paisible", "Révélateur", "Percutant", "Hypnotique"],
+    artists=["Dom Dolla", "The Blessed Madonna", "X-coast", "Ollie Lishman"],
+)
+
+
+def timing_stats(samples):
+    """Median, p95 (nearest rank), min and max of samples in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        "median_ms": statistics.median(ordered),
+        "p95_ms": ordered[min(len(ordered) - 1, -(-95 * len(ordered) // 100) - 1)],
+        "min_ms": ordered[0],
+        "max_ms": ordered[-1],
+        "samples": len(ordered),
+    }
+
+
+def measure(fn, repeat, warmup=0, setup=None):
+    """Call fn warmup times untimed, then repeat times, and return timing stats in milliseconds.
+
+    setup, if given, is called untimed before each timed call (e.g. to clear caches).
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return timing_stats(samples)
+
+
+# Seconds each case of the suite is sampled for in every round.
+SUITE_SLICE = 0.1
+
+
+def measure_interleaved(cases, repeat, slice_time=SUITE_SLICE):
+    """Measure cases ({name: fn}) in repeat rounds and return {name: timing stats in milliseconds}.
+
+    Every round calls each case for slice_time seconds (at least once), so
+    fast cases collect many samples and a slow or fast spell of the host
+    spreads over all cases instead of skewing the one measured at the time.
+    Each case is called once untimed first.
+    """
+    for fn in cases.values():
+        fn()
+    samples = {name: [] for name in cases}
+    for _ in range(repeat):
+        for name, fn in cases.items():
+            deadline = time.perf_counter() + slice_time
+            while True:
+                start = time.perf_counter()
+                fn()
+                end = time.perf_counter()
+                samples[name].append((end - start) * 1000)
+                if end >= deadline:
+                    break
+    return {name: timing_stats(case_samples) for name, case_samples in samples.items()}
+
+
+def bench_background(repeat):
+    """PNG decode vs mapping the raw sidecar vs copying the cached template.
+
+    The sidecar is built next to a temporary copy of the PNG, so the run
+    leaves assets/ untouched (a sidecar there would change how later
+    benchmarks and check_pixels.py load the background).
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = shutil.copy2(f"{ASSETS_DIR}/orange.png", tmp_dir)
+
+        def decode():
+            with Image.open(path) as image:
+                image.load()
+
+        def map_raw():
+            stat = os.stat(path)
+            fig._map_raw_asset(path, stat.st_mtime_ns, stat.st_size).copy()
+
+        fig.build_raw_asset(path)
+        fig.load_background(path)  # warm the cache
+        results = {
+            "background_decode": measure(decode, repeat),
+            "background_raw_mapped": measure(map_raw, repeat),
+            "background_cached_copy": measure(lambda: fig.load_background(path), repeat),
+        }
+        fig.clear_background_cache()  # release the mapping before the directory goes
+    return results
+
+
+LONG_STATION_NAME = " ".join(["Techno hypnotique et mentale jusqu'au bout de la nuit"] * 8)
+
+
+def naive_wrap_words(text, font, max_width):
+    """Previous wrapping loop: join and measure every candidate line twice."""
+    lines = []
+    current_line = []
+    for word in text.split():
+        test_line = ' '.join(current_line + [word])
+        test_width = font.getbbox(test_line)[2] - font.getbbox(test_line)[0]
+        if test_width <= max_width:
+            current_line.append(word)
+        elif current_line:
+            lines.append(' '.join(current_line))
+            current_line = [word]
+        else:
+            lines.append(word)
+    if current_line:
+        lines.append(' '.join(current_line))
+    return lines
+
+
+def bench_wrap(repeat):
+    """Word wrapping of a long station name on a wide and a narrow column.
+
+    wrap_words is timed cold (word metrics and text boxes of the font
+    cleared before each call, as for a new station name) and warm (the same
+    name again, served from those tables).
+    """
+    font = fig.load_font(f"{ASSETS_DIR}/Obviously-MediumItalic.otf", 127)
+
+    def clear_tables():
+        fig.clear_font_tables(font, (fig.WordMetrics, fig.TextBoxes))
+
+    results = {}
+    for max_width in (880, 4000):
+        if naive_wrap_words(LONG_STATION_NAME, font, max_width) != fig.wrap_words(LONG_STATION_NAME, font, max_width):
+            raise RuntimeError(f"wrap_words differs from the naive loop at max_width={max_width}")
+        results[f"wrap_naive_w{max_width}"] = measure(lambda: naive_wrap_words(LONG_STATION_NAME, font, max_width), repeat)
+        results[f"wrap_words_cold_w{max_width}"] = measure(
+            lambda: fig.wrap_words(LONG_STATION_NAME, font, max_width), repeat, setup=clear_tables)
+        results[f"wrap_words_warm_w{max_width}"] = measure(
+            lambda: fig.wrap_words(LONG_STATION_NAME, font, max_width), repeat, warmup=1)
+    return results
+
+
+def bench_dry_run(repeat):
+    """Layout-only validation, warm and while typing a new station name."""
+    card = dict(EXAMPLE_CARD)
+    fig.dry_run_freq_image(**card, assets_dir=ASSETS_DIR)
+
+    def type_station_name():
+        name = LONG_STATION_NAME[:120]
+        for end in range(1, len(name) + 1):
+            card["radio_station_name"] = name[:end]
+            fig.dry_run_freq_image(**card, assets_dir=ASSETS_DIR)
+
+    return {
+        "dry_run_warm": measure(lambda: fig.dry_run_freq_image(**EXAMPLE_CARD, assets_dir=ASSETS_DIR), repeat),
+        "dry_run_typing_120_keystrokes": measure(type_station_name, 1),
+    }
+
+
+ENCODINGS = {
+    "png_default": ("PNG", None),
+    "png_fast": ("PNG", {"compress_level": 1}),
+    "webp_q80": ("WEBP", {"quality": 80}),
+    "jpeg_q85": ("JPEG", {"quality": 85}),
+}
+
+
+def bench_encode(repeat):
+    """Encoding a rendered card with each output format (size reported in bytes)."""
+    layout = fig.layout_freq_image(**EXAMPLE_CARD, assets_dir=ASSETS_DIR)
+    image = fig.render_layout(layout)
+    results = {}
+    for name, (output_format, options) in ENCODINGS.items():
+        stats = measure(lambda: fig.encode_image(image, output_format, options), repeat)
+        stats["bytes"] = len(fig.encode_image(image, output_format, options))
+        results[f"encode_{name}"] = stats
+    for max_bytes in (300_000, 100_000):
+        budgeted = fig.encode_within_budget(image, max_bytes)
+        stats = timing_stats([budgeted.elapsed * 1000])
+        stats.update(bytes=len(budgeted.data), attempts=budgeted.attempts)
+        results[f"encode_budget_{max_bytes}"] = stats
+    return results
+
+
+def worker_counts():
+    """1, 2, 4, ... up to the number of cores (always including it)."""
+    cpus = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 < cpus:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpus:
+        counts.append(cpus)
+    return counts
+
+
+def bench_batch(repeat):
+    """Process pool throughput (cards per second) for each worker count."""
+    results = {}
+    for workers in worker_counts():
+        specs = [EXAMPLE_CARD] * (2 * workers)
+        with RenderPool(workers, ASSETS_DIR) as pool:
+            list(pool.map(specs[:workers]))  # start and warm every worker
+            stats = measure(lambda: list(pool.map(specs)), repeat)
+        stats["cards_per_s"] = len(specs) / (stats["median_ms"] / 1000)
+        results[f"batch_processes_{workers}"] = stats
+    return results
+
+
+def stress_specs(count):
+    """Varied cards (scene, pill count, seed) for concurrency checks."""
+    specs = []
+    for i in range(count):
+        specs.append(dict(
+            EXAMPLE_CARD,
+            scene_name=("L'Atrium", "Le Refuge")[i % 2],
+            tags=EXAMPLE_CARD["tags"] + [f"Tag {j}" for j in range(i % 7)],
+            seed=i,
+        ))
+    return specs
+
+
+def cold_caches():
+    """Drop parsed fonts, per-font tables (advances, glyph atlases, metrics) and decoded backgrounds."""
+    fig.clear_font_cache()
+    fig.clear_font_tables()
+    fig.clear_background_cache()
+
+
+def bench_thread_stress(repeat):
+    """16 threads rendering concurrently from cold caches must match serial output exactly.
+
+    Caches are cleared before each threaded pass, so fonts, font tables,
+    glyph atlases and backgrounds are populated by racing threads. Layouts
+    and renders are interleaved in the same pool. Raises RuntimeError on
+    any mismatch.
+    """
+    specs = stress_specs(16)
+    fast = {"encode_options": {"compress_level": 1}, "assets_dir": ASSETS_DIR}
+    serial_layouts = [fig.layout_freq_image(**spec, assets_dir=ASSETS_DIR).to_dict() for spec in specs]
+    serial_images = [fig.generate_freq_image(**spec, **fast) for spec in specs]
+    # Each render followed by four layouts of other cards
+    jobs = [job for i in range(len(specs))
+            for job in [("render", i)] + [("layout", (i + k) % len(specs)) for k in range(1, 5)]]
+
+    def run(job):
+        kind, i = job
+        if kind == "layout":
+            return fig.layout_freq_image(**specs[i], assets_dir=ASSETS_DIR).to_dict()
+        return fig.generate_freq_image(**specs[i], **fast)
+
+    def threaded():
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            outputs = list(executor.map(run, jobs))
+        expected = {"layout": serial_layouts, "render": serial_images}
+        mismatches = [f"{kind} {i}" for (kind, i), output in zip(jobs, outputs) if output != expected[kind][i]]
+        if mismatches:
+            raise RuntimeError(f"threaded output differs from serial for: {', '.join(mismatches)}")
+
+    return {"thread_stress_16": measure(threaded, repeat, setup=cold_caches)}
+
+
+def run_executor(mode, workers, cards):
+    """Render cards once with mode ("serial", "thread" or "process"); return seconds and peak RSS.
+
+    Meant to run in a fresh interpreter (see bench_executors) so that peak
+    RSS belongs to this mode only. For processes, the peak is estimated as
+    the parent's plus workers times the largest child's.
+    """
+    specs = [EXAMPLE_CARD] * cards
+    start = time.perf_counter()
+    if mode == "serial":
+        fig.preload_assets(ASSETS_DIR)
+        for spec in specs:
+            fig.generate_freq_image(**spec, assets_dir=ASSETS_DIR)
+    else:
+        with RenderPool(workers, ASSETS_DIR, executor=mode) as pool:
+            list(pool.map(specs))
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if mode == "process":
+        peak_kb += workers * resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"seconds": elapsed, "peak_rss_mb": peak_kb / 1024}
+
+
+def bench_executors(repeat):
+    """Serial vs thread pool vs process pool: throughput and peak RSS, each in a fresh interpreter."""
+    workers = os.cpu_count() or 1
+    cards = 4 * workers
+    results = {}
+    for mode in ("serial", "thread", "process"):
+        samples = []
+        for _ in range(repeat):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--executor-run", mode,
+                 "--workers", str(workers), "--cards", str(cards)],
+                check=True, capture_output=True, text=True).stdout
+            samples.append(json.loads(output))
+        stats = timing_stats([sample["seconds"] * 1000 for sample in samples])
+        stats["cards_per_s"] = cards / (stats["median_ms"] / 1000)
+        stats["peak_rss_mb"] = max(sample["peak_rss_mb"] for sample in samples)
+        results[f"executor_{mode}_{workers}"] = stats
+    return results
+
+
+def bench_render(repeat):
+    """Full generate_freq_image call with warm caches."""
+    return {
+        "render": measure(lambda: fig.generate_freq_image(**EXAMPLE_CARD, assets_dir=ASSETS_DIR), repeat, warmup=1),
+    }
+
+
+def pills(count, prefix):
+    """count distinct pill labels of varied lengths."""
+    return [f"{prefix} {i} " + "x" * (i % 9) for i in range(count)]
+
+
+# Card inputs covering realistic and worst cases: both scenes, short and long
+# station names, 0 to 200 pills and tags made of one very long word.
+SCENARIOS = {
+    "atrium_example": EXAMPLE_CARD,
+    "refuge_example": dict(
+        frequency="108.9",
+        scene_genre="Techno sombre",
+        scene_name="Le Refuge",
+        radio_station_name="Techno hypnotique et mentale",
+        verbatims=["Un club sombre", "Il faut que je me dépense"],
+        tags=["Industriel", "Énergique", "Nocturne", "Intense", "Transcendant"],
+        artists=["I Hate Models", "Clara Cuvé", "Reiner Zonneveld", "Rebekah"],
+    ),
+    "short_station": dict(EXAMPLE_CARD, radio_station_name="FIP"),
+    "long_station": dict(EXAMPLE_CARD, scene_name="Le Refuge", radio_station_name=LONG_STATION_NAME),
+    "pills_0": dict(EXAMPLE_CARD, verbatims=[], tags=[], artists=[]),
+    "pills_20": dict(EXAMPLE_CARD, verbatims=pills(5, "Verbatim"), tags=pills(10, "Tag"), artists=pills(5, "Artiste")),
+    "pills_200": dict(EXAMPLE_CARD, scene_name="Le Refuge", verbatims=pills(50, "Verbatim"),
+                      tags=pills(100, "Tag"), artists=pills(50, "Artiste")),
+    "long_word_tags": dict(EXAMPLE_CARD, tags=["Hyper" + "nocturne" * 40, "Méga" + "énergique" * 30, "Court"]),
+}
+
+
+def bench_scenarios(repeat):
+    """Layout pass, raster pass and full generate_freq_image for each scenario (interleaved rounds)."""
+    cases = {}
+    for name, card in SCENARIOS.items():
+        layout = fig.layout_freq_image(**card, assets_dir=ASSETS_DIR)
+        cases[f"scenario_{name}_layout"] = lambda card=card: fig.layout_freq_image(**card, assets_dir=ASSETS_DIR)
+        cases[f"scenario_{name}_raster"] = lambda layout=layout: fig.render_layout(layout)
+        cases[f"scenario_{name}_total"] = lambda card=card: fig.generate_freq_image(**card, assets_dir=ASSETS_DIR)
+    return measure_interleaved(cases, repeat)
+
+
+def bench_helpers(repeat):
+    """Each drawing helper on its own, plus pill layout and PNG encode (interleaved rounds)."""
+    fonts = fig.card_fonts(ASSETS_DIR)
+    background = fig.load_background(f"{ASSETS_DIR}/orange.png")
+    draw = ImageDraw.Draw(background)
+    white = (255, 255, 255, 255)
+    black = (0, 0, 0, 255)
+    many_pills = SCENARIOS["pills_200"]
+    no_pills = SCENARIOS["pills_0"]
+    image = fig.render_layout(fig.layout_freq_image(**EXAMPLE_CARD, assets_dir=ASSETS_DIR))
+    return measure_interleaved({
+        "helper_draw_text_with_tracking":
+            lambda: fig.draw_text_with_tracking(draw, (66, 311), "108.9 FM", fonts["frequency"], white, -8),
+        "helper_draw_wrapped_text":
+            lambda: fig.draw_wrapped_text(draw, LONG_STATION_NAME, fonts["radio_station"], white, (66, 800),
+                                          max_width=880, tracking=-7, max_lines=3),
+        "helper_draw_pill":
+            lambda: fig.draw_pill(draw, "The Blessed Madonna", fonts["tags"], black, white,
+                                  pos=(66, 1300), padding_x=25, pill_height=78),
+        # Pill layout cost: layout with 200 pills minus layout without pills
+        "helper_pill_layout_200": lambda: fig.layout_freq_image(**many_pills, assets_dir=ASSETS_DIR),
+        "helper_pill_layout_0": lambda: fig.layout_freq_image(**no_pills, assets_dir=ASSETS_DIR),
+        "helper_encode_png": lambda: fig.encode_image(image),
+    }, repeat)
+
+
+# The suite compared across commits, then slower or exploratory comparisons.
+SUITE = [bench_helpers, bench_scenarios]
+BENCHMARKS = SUITE + [bench_background, bench_wrap, bench_dry_run, bench_encode, bench_batch,
+                      bench_thread_stress, bench_executors, bench_render]
+
+
+def environment():
+    """Metadata needed to compare runs: commit, interpreter, Pillow, host."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def run_benchmarks(repeat, only=None, run_all=False):
+    """Run the selected benchmarks and return {name: stats}."""
+    results = {}
+    for bench in BENCHMARKS:
+        name = bench.__name__[len("bench_"):]
+        if only:
+            if name not in only:
+                continue
+        elif bench not in SUITE and not run_all:
+            continue
+        results.update(bench(repeat))
+    return results
+
+
+def print_results(results, file=sys.stdout):
+    for name, stats in results.items():
+        extra = f"  {stats['bytes']} bytes" if "bytes" in stats else ""
+        extra += f"  {stats['attempts']} attempts" if "attempts" in stats else ""
+        extra += f"  {stats['cards_per_s']:.2f} cards/s" if "cards_per_s" in stats else ""
+        extra += f"  {stats['peak_rss_mb']:.0f} MB peak" if "peak_rss_mb" in stats else ""
+        print(f"{name:<36} median {stats['median_ms']:9.3f} ms  p95 {stats['p95_ms']:9.3f} ms  "
+              f"min {stats['min_ms']:9.3f} ms  max {stats['max_ms']:9.3f} ms{extra}", file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Iterations per measurement")
+    parser.add_argument("--only", action="append", metavar="NAME",
+                        help="Run only this benchmark (e.g. helpers, scenarios, wrap, batch); can be repeated")
+    parser.add_argument("--all", action="store_true", help="Also run the benchmarks outside the suite")
+    parser.add_argument("--json", metavar="PATH", help="Write results and metadata as JSON (- for stdout)")
+    parser.add_argument("--executor-run", choices=["serial", "thread", "process"], help=argparse.SUPPRESS)
+    parser.add_argument("--workers", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--cards", type=int, default=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.executor_run:
+        print(json.dumps(run_executor(args.executor_run, args.workers, args.cards)))
+        return
+
+    results = run_benchmarks(args.repeat, args.only, args.all)
+    report = {"environment": environment(), "repeat": args.repeat, "results": results}
+    if args.json == "-":
+        print(json.dumps(report, indent=2))
+        return
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+"""Pre-decode the PNG backgrounds in an assets directory into raw RGBA sidecars.
+
+Usage:
+    python build_raw_assets.py [assets_dir]
+"""
+import sys
+
+from freq_image_gen import build_raw_assets
+
+if __name__ == "__main__":
+    assets_dir = sys.argv[1] if len(sys.argv) > 1 else "assets"
+    for path in build_raw_assets(assets_dir):
+        print(f"Wrote {path}")
@@ -0,0 +1,242 @@
+"""Pixel-equivalence harness: check that the optimized render paths draw exactly what the reference draws.
+
+Usage:
+    python check_pixels.py [--reference REV | --reference-file PATH] [--tolerance N]
+                           [--max-differing RATIO] [--diff-dir DIR] [--only NAME ...]
+
+Every card of the corpus (the benchmark scenarios, with the default seed)
+is rendered by the reference generate_freq_image -- freq_image_gen.py as of
+git revision REV, the original implementation by default, or a pinned copy
+given with --reference-file -- and by each candidate path of the working
+tree: warm and cold caches, backgrounds decoded from PNG or mapped from raw
+sidecars, a replayed display list, and concurrent threads. Two images match exactly when every
+RGBA byte is equal; they match within tolerance when no more than
+--max-differing of the pixels have a channel differing by more than
+--tolerance. For every mismatch the reference, the candidate and a diff
+image (differing pixels in red over the greyed reference) are written to
+--diff-dir. Exits 1 if any card fails.
+"""
+import argparse
+import base64
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageChops
+
+import freq_image_gen as fig
+from bench_freq_image import ASSETS_DIR, SCENARIOS
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def git(*args):
+    return subprocess.run(["git", *args], cwd=HERE, capture_output=True, text=True, check=True).stdout.strip()
+
+
+def load_module(name, file_name, source):
+    """Execute source as a standalone module (not registered in sys.modules)."""
+    module = types.ModuleType(name)
+    module.__file__ = file_name
+    exec(compile(source, file_name, "exec"), module.__dict__)
+    return module
+
+
+def load_reference(revision):
+    """Import freq_image_gen.py as of a git revision, as a standalone module.
+
+    Refuses the commit checked out (e.g. the graft commit of a shallow
+    clone), which would compare the code under test with itself.
+    """
+    commit = git("rev-parse", "--verify", f"{revision}^{{commit}}")
+    if commit == git("rev-parse", "HEAD"):
+        raise SystemExit(f"Reference revision {revision} is HEAD, so the check would compare the code with "
+                         "itself (shallow clone?). Fetch the history, or pass --reference or --reference-file.")
+    return load_module(f"freq_image_gen_{commit[:12]}", f"{commit[:12]}:freq_image_gen.py",
+                       git("show", f"{commit}:freq_image_gen.py"))
+
+
+def root_revision():
+    """The repository's first commit, i.e. the original implementation."""
+    if git("rev-parse", "--is-shallow-repository") == "true":
+        raise SystemExit("Shallow clone: the first commit is not available. "
+                         "Fetch the history, or pass --reference or --reference-file.")
+    return git("rev-list", "--max-parents=0", "HEAD").split()[0]
+
+
+def decode(image_base64):
+    return Image.open(io.BytesIO(base64.b64decode(image_base64))).convert("RGBA")
+
+
+def copy_assets(directory, sidecars):
+    """Copy ASSETS_DIR into directory, without raw sidecars, then build them if sidecars is True."""
+    for file_name in os.listdir(ASSETS_DIR):
+        if not file_name.endswith(fig.RAW_ASSET_SUFFIX):
+            shutil.copy2(os.path.join(ASSETS_DIR, file_name), directory)
+    if sidecars:
+        fig.build_raw_assets(directory)
+    return directory
+
+
+def cold_caches():
+    """Drop parsed fonts, per-font tables (advances, glyph atlases, metrics) and decoded backgrounds."""
+    fig.clear_font_cache()
+    fig.clear_font_tables()
+    fig.clear_background_cache()
+
+
+def render_generate(card, assets):
+    """Candidate: the public generate_freq_image with warm caches."""
+    return decode(fig.generate_freq_image(**card, assets_dir=assets["png"]))
+
+
+def render_cold_png(card, assets):
+    """Candidate: first render after clearing every cache, backgrounds decoded from PNG."""
+    cold_caches()
+    return decode(fig.generate_freq_image(**card, assets_dir=assets["png"]))
+
+
+def render_cold_sidecar(card, assets):
+    """Candidate: first render after clearing every cache, backgrounds mapped from raw sidecars."""
+    cold_caches()
+    return decode(fig.generate_freq_image(**card, assets_dir=assets["sidecar"]))
+
+
+def render_warm_sidecar(card, assets):
+    """Candidate: warm render from the cached mapped sidecar."""
+    return decode(fig.generate_freq_image(**card, assets_dir=assets["sidecar"]))
+
+
+def render_replayed_layout(card, assets):
+    """Candidate: a layout serialized to a dict and back, then rendered (as a cached display list would be)."""
+    layout = fig.layout_freq_image(**card, assets_dir=assets["png"])
+    return fig.render_layout(fig.Layout.from_dict(layout.to_dict())).convert("RGBA")
+
+
+def render_threads_cold(card, assets, threads=8):
+    """Candidate: the same card rendered by several threads at once from cold caches.
+
+    Returns the first render that differs from the others, if any, so a
+    race shows up as a mismatch.
+    """
+    cold_caches()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        renders = list(executor.map(lambda _: fig.generate_freq_image(**card, assets_dir=assets["png"]),
+                                    range(threads)))
+    return decode(next((render for render in renders if render != renders[0]), renders[0]))
+
+
+CANDIDATES = {
+    "generate": render_generate,
+    "cold_png": render_cold_png,
+    "cold_sidecar": render_cold_sidecar,
+    "warm_sidecar": render_warm_sidecar,
+    "replayed_layout": render_replayed_layout,
+    "threads_cold": render_threads_cold,
+}
+
+
+def compare_images(reference, candidate, tolerance):
+    """Per-pixel comparison of two RGBA images.
+
+    Returns (differing, max_delta, mask): the number of pixels with a channel
+    differing by more than tolerance, the largest channel difference, and a
+    mode "1" mask of those pixels (None when the sizes differ).
+    """
+    if reference.size != candidate.size:
+        return reference.width * reference.height, 255, None
+    delta = ImageChops.difference(reference, candidate)
+    max_delta = max(high for _, high in delta.getextrema())
+    # Largest channel difference per pixel, thresholded at tolerance
+    bands = delta.split()
+    per_pixel = bands[0]
+    for band in bands[1:]:
+        per_pixel = ImageChops.lighter(per_pixel, band)
+    mask = per_pixel.point(lambda value: 255 if value > tolerance else 0).convert("1")
+    differing = mask.histogram()[-1]
+    return differing, max_delta, mask
+
+
+def write_diff(diff_dir, name, reference, candidate, mask):
+    """Write reference, candidate and diff PNGs for one mismatch; return the diff path."""
+    os.makedirs(diff_dir, exist_ok=True)
+    reference.save(os.path.join(diff_dir, f"{name}.reference.png"))
+    candidate.save(os.path.join(diff_dir, f"{name}.candidate.png"))
+    diff_path = os.path.join(diff_dir, f"{name}.diff.png")
+    if mask is None:
+        return None
+    diff = Image.blend(reference.convert("L").convert("RGB"), Image.new("RGB", reference.size, "white"), 0.6)
+    diff.paste((255, 0, 0), mask=mask)
+    diff.save(diff_path)
+    return diff_path
+
+
+def check_card(name, card, reference, assets, args):
+    """Compare every candidate render of a card with the reference; return the number of failures."""
+    failures = 0
+    for path, render in CANDIDATES.items():
+        candidate = render(card, assets)
+        exact = reference.size == candidate.size and reference.tobytes() == candidate.tobytes()
+        if exact:
+            print(f"EXACT   {name:<24} {path}")
+            continue
+        differing, max_delta, mask = compare_images(reference, candidate, args.tolerance)
+        ratio = differing / (reference.width * reference.height)
+        passed = mask is not None and ratio <= args.max_differing
+        diff_path = write_diff(args.diff_dir, f"{name}.{path}", reference, candidate, mask)
+        failures += not passed
+        print(f"{'CLOSE' if passed else 'FAIL':<7} {name:<24} {path}  {differing} pixels beyond tolerance "
+              f"({ratio:.4%}), max channel delta {max_delta}"
+              + (f", diff in {diff_path}" if diff_path else f", size {candidate.size} != {reference.size}"))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    reference = parser.add_mutually_exclusive_group()
+    reference.add_argument("--reference", metavar="REV", help="Git revision of the reference freq_image_gen.py "
+                                                              "(default: the first commit)")
+    reference.add_argument("--reference-file", metavar="PATH",
+                           help="Pinned copy of the reference freq_image_gen.py, instead of a git revision")
+    parser.add_argument("--tolerance", type=int, default=0,
+                        help="Largest channel difference still counted as equal (default 0)")
+    parser.add_argument("--max-differing", type=float, default=0.0,
+                        help="Fraction of pixels allowed beyond the tolerance (default 0)")
+    parser.add_argument("--diff-dir", default="pixel_diffs", help="Where to write mismatch images (default pixel_diffs)")
+    parser.add_argument("--only", action="append", metavar="NAME", help="Check only this card; can be repeated")
+    args = parser.parse_args()
+
+    if args.reference_file:
+        with open(args.reference_file, encoding="utf-8") as f:
+            reference_module = load_module("freq_image_gen_reference", args.reference_file, f.read())
+        reference_name = args.reference_file
+    else:
+        revision = args.reference or root_revision()
+        reference_module = load_reference(revision)
+        reference_name = revision[:12]
+    cards = {name: card for name, card in SCENARIOS.items() if not args.only or name in args.only}
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Explicit asset copies, so which background path runs never depends on files left in assets/
+        assets = {
+            "png": copy_assets(tempfile.mkdtemp(dir=tmp_dir), sidecars=False),
+            "sidecar": copy_assets(tempfile.mkdtemp(dir=tmp_dir), sidecars=True),
+        }
+        for name, card in cards.items():
+            reference = decode(reference_module.generate_freq_image(**card, assets_dir=assets["png"]))
+            failures += check_card(name, card, reference, assets, args)
+        cold_caches()  # release mapped sidecars before the directory goes
+
+    print(f"{len(cards)} cards x {len(CANDIDATES)} paths against {reference_name}: {failures} failures")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""asyncio front-end for generate_freq_image that never blocks the event loop."""
+import asyncio
+import os
+import weakref
+from concurrent.futures import Executor
+from functools import partial
+
+from freq_image_gen import generate_freq_image
+
+
+class AsyncRenderer:
+    """Runs generate_freq_image in an executor with at most max_in_flight renders at once.
+
+    Requests beyond max_in_flight wait in a queue (see queue_depth). A request
+    cancelled while queued never starts rendering. A request cancelled while
+    rendering returns immediately, but keeps its slot until the executor
+    finishes the work, so the in-flight limit always reflects real load.
+
+    executor is any concurrent.futures.Executor (a ProcessPoolExecutor to use
+    several cores); None uses the event loop's default thread pool.
+
+    The renderer can be used from successive event loops (several
+    asyncio.run calls, one loop per test): each loop gets its own set of
+    max_in_flight slots.
+    """
+
+    def __init__(self, executor: Executor = None, max_in_flight: int = None):
+        self.executor = executor
+        self.max_in_flight = max_in_flight or os.cpu_count() or 1
+        self._slots = weakref.WeakKeyDictionary()  # event loop -> Semaphore
+        self._queued = 0
+        self._in_flight = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of requests waiting for a free slot."""
+        return self._queued
+
+    @property
+    def in_flight(self) -> int:
+        """Number of renders currently running in the executor."""
+        return self._in_flight
+
+    def _loop_slots(self, loop) -> asyncio.Semaphore:
+        # asyncio primitives bind to the first loop that waits on them
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self.max_in_flight)
+        return slots
+
+    def _release(self, slots, _future=None):
+        self._in_flight -= 1
+        slots.release()
+
+    async def render(self, *args, **kwargs) -> str:
+        """Same arguments and result as generate_freq_image."""
+        return await self.run(generate_freq_image, *args, **kwargs)
+
+    async def run(self, function, *args, **kwargs):
+        """Run function(*args, **kwargs) in the executor under the in-flight limit."""
+        loop = asyncio.get_running_loop()
+        slots = self._loop_slots(loop)
+        self._queued += 1
+        try:
+            await slots.acquire()
+        finally:
+            self._queued -= 1
+
+        self._in_flight += 1
+        try:
+            future = loop.run_in_executor(self.executor, partial(function, *args, **kwargs))
+        except BaseException:
+            self._release(slots)
+            raise
+        future.add_done_callback(partial(self._release, slots))
+        return await asyncio.shield(future)
+
+
+_default_renderer = None
+
+
+def default_renderer() -> AsyncRenderer:
+    """Return the renderer used by agenerate_freq_image, creating it on first use."""
+    global _default_renderer
+    if _default_renderer is None:
+        _default_renderer = AsyncRenderer()
+    return _default_renderer
+
+
+def set_default_renderer(renderer: AsyncRenderer):
+    """Replace the renderer used by agenerate_freq_image (e.g. another executor or limit)."""
+    global _default_renderer
+    _default_renderer = renderer
+
+
+async def agenerate_freq_image(*args, **kwargs) -> str:
+    """
+    Version asyncio de generate_freq_image : le rendu tourne dans un executor, avec un nombre
+    limité de rendus simultanés (voir AsyncRenderer et set_default_renderer).
+
+    Returns :
+        str : Image encodée en base64
+    """
+    return await default_renderer().render(*args, **kwargs)
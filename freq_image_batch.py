@@ -0,0 +1,121 @@
+"""Batch rendering of frequency cards over a pool of warm workers (processes or threads)."""
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator
+
+from freq_image_gen import generate_freq_image, preload_assets
+
+
+# Executor types accepted by RenderPool.
+EXECUTORS = {
+    'process': ProcessPoolExecutor,
+    'thread': ThreadPoolExecutor,
+}
+
+
+def _init_worker(*assets_dirs: str):
+    """Worker initializer: load fonts and backgrounds once per process (no-op for later threads).
+
+    Directories with missing assets are skipped; renders using them report the error.
+    """
+    for assets_dir in assets_dirs:
+        try:
+            preload_assets(assets_dir)
+        except FileNotFoundError:
+            pass
+
+
+def _render_spec(spec: dict) -> str:
+    """Render one spec (generate_freq_image keyword arguments)."""
+    return generate_freq_image(**spec)
+
+
+class RenderPool:
+    """A process or thread pool whose workers preload the card assets at start-up.
+
+    Keep one pool alive to render several batches without paying for
+    worker start-up and asset loading again:
+
+        with RenderPool(workers=4) as pool:
+            for image_base64 in pool.map(specs):
+                ...
+
+    Specs are dicts of generate_freq_image keyword arguments.
+
+    preload lists the asset directories loaded by each worker at start-up
+    (default: assets_dir alone).
+
+    executor="thread" renders in threads of the current process: fonts and
+    backgrounds are shared instead of loaded per worker, and Pillow releases
+    the GIL during parts of drawing and zlib encoding. Whether that beats
+    processes depends on the host; see the executors benchmark.
+    """
+
+    def __init__(self, workers: int = None, assets_dir: str = "assets", executor: str = "process",
+                 preload: Iterable[str] = None):
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor: {executor}. Must be one of {', '.join(EXECUTORS)}")
+        self.workers = workers or os.cpu_count() or 1
+        self.assets_dir = assets_dir
+        self._executor = EXECUTORS[executor](max_workers=self.workers, initializer=_init_worker,
+                                             initargs=tuple(preload or (assets_dir,)))
+
+    def _with_assets_dir(self, spec: dict) -> dict:
+        return spec if 'assets_dir' in spec else {**spec, 'assets_dir': self.assets_dir}
+
+    def submit(self, spec: dict):
+        """Schedule one spec and return its Future (resolving to the base64 image)."""
+        return self._executor.submit(_render_spec, self._with_assets_dir(spec))
+
+    def map(self, specs: Iterable[dict], ordered: bool = True) -> Iterator:
+        """Render specs in parallel and stream the results.
+
+        With ordered=True, base64 images are yielded in input order, each one
+        as soon as it and all the previous ones are done. With ordered=False,
+        (index, base64) pairs are yielded as soon as each render finishes.
+        """
+        futures = [self.submit(spec) for spec in specs]
+        return self._results(futures, ordered)
+
+    @staticmethod
+    def _results(futures, ordered):
+        try:
+            if ordered:
+                for future in futures:
+                    yield future.result()
+            else:
+                indices = {future: index for index, future in enumerate(futures)}
+                for future in as_completed(futures):
+                    yield indices[future], future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def generate_freq_images(specs: Iterable[dict], workers: int = None, assets_dir: str = "assets",
+                         ordered: bool = True, executor: str = "process") -> Iterator:
+    """
+    Génère plusieurs images en parallèle sur un pool de processus ou de threads (voir RenderPool.map).
+
+    Arguments :
+        specs : (Iterable[dict]) Arguments de generate_freq_image pour chaque image
+        workers : (int, optionnel) Nombre de processus. Par défaut le nombre de cœurs.
+        assets_dir : (str, optionnel) Dossier des assets préchargés par les processus. Par défaut "assets".
+        ordered : (bool, optionnel) Si True (défaut), les images arrivent dans l'ordre des specs ;
+            sinon des paires (index, image) arrivent dès qu'elles sont prêtes.
+        executor : (str, optionnel) "process" (défaut) ou "thread".
+
+    Returns :
+        Iterator : Images encodées en base64, au fil de l'eau
+    """
+    with RenderPool(workers, assets_dir, executor) as pool:
+        yield from pool.map(specs, ordered=ordered)
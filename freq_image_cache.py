@@ -0,0 +1,615 @@
+"""Request coalescing and caching layers in front of generate_freq_image."""
+import asyncio
+import base64
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, as_completed
+from functools import lru_cache
+from io import BytesIO
+
+from PIL import Image
+
+from freq_image_async import default_renderer
+from freq_image_batch import RenderPool
+from freq_image_gen import (CARD_FONTS, OUTPUT_FORMATS, SCENE_BACKGROUNDS, generate_freq_image,
+                            render_freq_image, save_output, write_file_atomic)
+
+_SIGNATURE = inspect.signature(generate_freq_image)
+_DEFAULTS = {name: parameter.default for name, parameter in _SIGNATURE.parameters.items()
+             if parameter.default is not parameter.empty}
+_REQUIRED = _SIGNATURE.parameters.keys() - _DEFAULTS.keys()
+
+
+def canonical_arguments(*args, **kwargs) -> dict:
+    """Bind generate_freq_image arguments by name, with defaults filled in and assets_dir made absolute."""
+    if not args and _REQUIRED <= kwargs.keys() <= _SIGNATURE.parameters.keys():
+        # Fast path for keyword-only calls, the common case on cache hits
+        arguments = {**_DEFAULTS, **kwargs}
+    else:
+        bound = _SIGNATURE.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+    arguments['assets_dir'] = os.path.abspath(arguments['assets_dir'])
+    return arguments
+
+
+def render_key(arguments: dict) -> str:
+    """Hash canonical arguments into a hex key; equal keys mean identical renders."""
+    payload = json.dumps(arguments, sort_keys=True, ensure_ascii=False, default=list)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls to generate_freq_image into one render.
+
+    The first caller for a given set of arguments renders; callers arriving
+    while that render is in flight wait for it and get the same result (or
+    exception). Works from threads (__call__) and from asyncio (acall, which
+    renders through the default AsyncRenderer).
+    """
+
+    def __init__(self, render=generate_freq_image):
+        self.render = render
+        self.calls = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._async_in_flight = {}
+
+    def stats(self) -> dict:
+        """Return call and coalesced-call counters and the number of renders in flight."""
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._in_flight) + len(self._async_in_flight),
+            }
+
+    def __call__(self, *args, **kwargs) -> str:
+        """Same arguments and result as generate_freq_image."""
+        key = render_key(canonical_arguments(*args, **kwargs))
+        with self._lock:
+            self.calls += 1
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(self.render(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return future.result()
+
+    async def acall(self, *args, **kwargs) -> str:
+        """asyncio version of __call__."""
+        # Tasks belong to one event loop, so only coalesce callers on the same loop
+        key = asyncio.get_running_loop(), render_key(canonical_arguments(*args, **kwargs))
+        with self._lock:
+            self.calls += 1
+            task = self._async_in_flight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(default_renderer().run(self.render, *args, **kwargs))
+                self._async_in_flight[key] = task
+                task.add_done_callback(lambda _: self._forget(key))
+            else:
+                self.coalesced += 1
+        # Shielded, so a cancelled caller does not cancel the render for the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key):
+        with self._lock:
+            del self._async_in_flight[key]
+
+
+@lru_cache(maxsize=64)
+def _file_digest(path: str, mtime_ns: int, file_size: int) -> str:
+    """SHA-256 of a file's content, computed once per (path, mtime, size) fingerprint."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def assets_fingerprint(assets_dir: str = "assets") -> str:
+    """Hash the content of every font and background a card uses.
+
+    Based on content rather than mtime, so redeploying identical assets keeps
+    cached renders valid while any real change invalidates them.
+    """
+    file_names = sorted({file_name for file_name, _ in CARD_FONTS.values()} | set(SCENE_BACKGROUNDS.values()))
+    digest = hashlib.sha256()
+    for file_name in file_names:
+        path = os.path.join(assets_dir, file_name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            digest.update(f"{file_name}:missing\n".encode('utf-8'))
+            continue
+        digest.update(f"{file_name}:{_file_digest(path, stat.st_mtime_ns, stat.st_size)}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+# Seconds a fingerprint is reused before the asset files are checked again.
+ASSETS_FINGERPRINT_TTL = 5.0
+_fingerprints = {}  # assets_dir -> (fingerprint, expires_at)
+_fingerprints_lock = threading.Lock()
+
+
+def current_assets_fingerprint(assets_dir: str = "assets", refresh: bool = False) -> str:
+    """assets_fingerprint, recomputed at most every ASSETS_FINGERPRINT_TTL seconds per assets_dir.
+
+    Keeps memory cache hits off the filesystem; a deploy is picked up within
+    the TTL, or at once after refresh_assets_fingerprint(). refresh=True
+    recomputes it now, as needed before writing anything keyed by it.
+    """
+    assets_dir = os.path.abspath(assets_dir)
+    now = time.monotonic()
+    with _fingerprints_lock:
+        cached = _fingerprints.get(assets_dir)
+    if cached is not None and cached[1] > now and not refresh:
+        return cached[0]
+    fingerprint = assets_fingerprint(assets_dir)
+    with _fingerprints_lock:
+        _fingerprints[assets_dir] = fingerprint, now + ASSETS_FINGERPRINT_TTL
+    return fingerprint
+
+
+def refresh_assets_fingerprint(assets_dir: str = None):
+    """Forget the fingerprint of assets_dir (of every directory if None), e.g. right after a deploy."""
+    with _fingerprints_lock:
+        if assets_dir is None:
+            _fingerprints.clear()
+        else:
+            _fingerprints.pop(os.path.abspath(assets_dir), None)
+
+
+def cache_key(arguments: dict, refresh: bool = False) -> str:
+    """Key of an encoded output: canonical arguments plus the assets fingerprint.
+
+    output_path and assets_dir are left out: the fingerprint stands for the
+    assets, so the same cards keep their key when identical assets are
+    deployed to another directory. Without refresh the fingerprint may be up
+    to ASSETS_FINGERPRINT_TTL seconds old, which is only fine for memory
+    lookups: disk lookups and every write use refresh=True.
+    """
+    key_arguments = {name: value for name, value in arguments.items() if name not in ('output_path', 'assets_dir')}
+    key_arguments['assets_fingerprint'] = current_assets_fingerprint(arguments['assets_dir'], refresh)
+    return render_key(key_arguments)
+
+
+def render_encoded(arguments: dict):
+    """Render canonical arguments (output_path ignored) and return (encoded bytes, output_format)."""
+    result = render_freq_image(**{name: value for name, value in arguments.items() if name != 'output_path'})
+    return result.encoded, result.output_format
+
+
+def render_for_cache(arguments: dict):
+    """Render canonical arguments and return (key, encoded bytes, output_format).
+
+    key is computed from fresh fingerprints before and after rendering, and
+    is None if the assets changed in between: the output may then mix old
+    and new assets and must not be stored.
+    """
+    key = cache_key(arguments, refresh=True)
+    data, output_format = render_encoded(arguments)
+    if cache_key(arguments, refresh=True) != key:
+        key = None
+    return key, data, output_format
+
+
+def write_cached_output(output_path: str, data: bytes, output_format: str):
+    """Write cached encoded bytes to output_path, re-encoding only if its extension needs another format."""
+    save_output(Image.open(BytesIO(data)), output_path, data, output_format)
+
+
+class DiskRenderCache:
+    """Content-addressed on-disk cache of encoded cards, bounded by total size with LRU eviction.
+
+    Entries are files named <key>.<format> in directory. Reads refresh the
+    file mtime, which is the recency used for eviction; the index is built
+    from the directory when the cache is created.
+
+    Several processes can share directory (e.g. a server and
+    warm_render_cache.py). A key missing from the index is looked up on disk
+    before counting as a miss, so files written by another process are
+    served and adopted into the index. Each process enforces max_size over
+    the entries it has indexed, so the directory can exceed max_size by
+    what the others wrote since; rescan() re-reads the whole directory and
+    the next put() then evicts the least recently used files, whoever wrote
+    them. Files evicted by another process are dropped from the index when
+    a read finds them gone.
+
+    Calling the cache works like generate_freq_image, serving unchanged
+    cards from disk:
+
+        cache = DiskRenderCache("render_cache", max_size=256 * 1024 * 1024)
+        image_base64 = cache(frequency="97.3", ...)
+    """
+
+    def __init__(self, directory: str, max_size: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (path, output_format, size), least recently used first
+        self._size = 0
+        os.makedirs(directory, exist_ok=True)
+        self.rescan()
+
+    def rescan(self):
+        """Rebuild the index from the files in directory, including those written by other processes."""
+        extensions = {output_format.lower(): output_format for output_format in OUTPUT_FORMATS}
+        found = []
+        for entry in os.scandir(self.directory):
+            key, _, extension = entry.name.partition('.')
+            if entry.is_file() and extension in extensions:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime_ns, key, entry.path, extensions[extension], stat.st_size))
+        entries = OrderedDict((key, (path, output_format, size))
+                              for _, key, path, output_format, size in sorted(found))
+        with self._lock:
+            self._entries = entries
+            self._size = sum(size for _, _, size in entries.values())
+
+    def _adopt(self, key: str):
+        """Index a file another process stored under key; return its entry or None."""
+        for output_format in OUTPUT_FORMATS:
+            path = os.path.join(self.directory, f"{key}.{output_format.lower()}")
+            try:
+                size = os.stat(path).st_size
+            except FileNotFoundError:
+                continue
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._entries[key] = (path, output_format, size)
+                    self._size += size
+                return entry
+        return None
+
+    def stats(self) -> dict:
+        """Return hit, miss and eviction counters, entry count and total size in bytes."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._entries), 'size': self._size}
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            if key in self._entries:
+                return True
+        return self._adopt(key) is not None
+
+    def get(self, key: str):
+        """Return (encoded bytes, output_format) for key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            entry = self._adopt(key)
+        if entry is not None:
+            path, output_format, _ = entry
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path)
+            except FileNotFoundError:
+                self._discard(key)
+            else:
+                with self._lock:
+                    self.hits += 1
+                return data, output_format
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes, output_format: str):
+        """Store encoded bytes under key, evicting least recently used entries beyond max_size."""
+        path = os.path.join(self.directory, f"{key}.{output_format.lower()}")
+        write_file_atomic(path, data)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[2]
+            self._entries[key] = (path, output_format, len(data))
+            self._size += len(data)
+            evicted = []
+            while self._size > self.max_size and len(self._entries) > 1:
+                _, (old_path, _, old_size) = self._entries.popitem(last=False)
+                self._size -= old_size
+                self.evictions += 1
+                evicted.append(old_path)
+        for old_path in evicted:
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+
+    def _discard(self, key: str):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= entry[2]
+
+    def clear(self):
+        """Remove every entry from disk."""
+        with self._lock:
+            paths = [path for path, _, _ in self._entries.values()]
+            self._entries.clear()
+            self._size = 0
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def __call__(self, *args, **kwargs) -> str:
+        """Same arguments and result as generate_freq_image."""
+        arguments = canonical_arguments(*args, **kwargs)
+        cached = self.get(cache_key(arguments, refresh=True))
+        if cached is None:
+            key, *cached = render_for_cache(arguments)
+            if key is not None:
+                self.put(key, *cached)
+        data, output_format = cached
+        if arguments['output_path'] is not None:
+            write_cached_output(arguments['output_path'], data, output_format)
+        return base64.b64encode(data).decode('utf-8')
+
+
+class MemoryRenderCache:
+    """In-memory LRU cache of base64 cards, bounded by total size in bytes, with an optional TTL.
+
+    Calling the cache works like generate_freq_image. Entries are keyed like
+    DiskRenderCache, so asset changes invalidate them too; invalidate() drops
+    one card explicitly and clear() drops everything.
+    """
+
+    def __init__(self, max_size: int = 256 * 1024 * 1024, ttl: float = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (base64, output_format, expires_at), least recently used first
+        self._size = 0
+
+    def stats(self) -> dict:
+        """Return hit, miss, eviction and expiration counters, entry count and total size in bytes."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'expirations': self.expirations, 'entries': len(self._entries), 'size': self._size}
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (entry[2] is None or entry[2] > time.monotonic())
+
+    def get(self, key: str):
+        """Return (base64, output_format) for key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key: str, image_base64: str, output_format: str):
+        """Store a base64 card under key, evicting least recently used entries beyond max_size."""
+        if len(image_base64) > self.max_size:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (image_base64, output_format, expires_at)
+            self._size += len(image_base64)
+            while self._size > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[0])
+
+    def invalidate(self, *args, **kwargs) -> bool:
+        """Drop the card rendered by these generate_freq_image arguments; return True if it was cached."""
+        return self.invalidate_key(cache_key(canonical_arguments(*args, **kwargs)))
+
+    def invalidate_key(self, key: str) -> bool:
+        """Drop the entry of key; return True if it was cached."""
+        with self._lock:
+            found = key in self._entries
+            self._remove(key)
+            return found
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __call__(self, *args, **kwargs) -> str:
+        """Same arguments and result as generate_freq_image."""
+        arguments = canonical_arguments(*args, **kwargs)
+        cached = self.get(cache_key(arguments))
+        if cached is None:
+            key, data, output_format = render_for_cache(arguments)
+            cached = base64.b64encode(data).decode('utf-8'), output_format
+            if key is not None:
+                self.put(key, *cached)
+        image_base64, output_format = cached
+        if arguments['output_path'] is not None:
+            write_cached_output(arguments['output_path'], base64.b64decode(image_base64), output_format)
+        return image_base64
+
+
+class TwoTierRenderCache:
+    """A MemoryRenderCache in front of a DiskRenderCache.
+
+    Lookups try memory, then disk (promoting disk hits to memory); renders
+    are stored in both. Calling the cache works like generate_freq_image.
+    """
+
+    def __init__(self, memory: MemoryRenderCache, disk: DiskRenderCache):
+        self.memory = memory
+        self.disk = disk
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.memory or key in self.disk
+
+    def stats(self) -> dict:
+        return {'memory': self.memory.stats(), 'disk': self.disk.stats()}
+
+    def get(self, key: str):
+        """Return (base64, output_format) for key, or None."""
+        cached = self.memory.get(key)
+        if cached is None:
+            cached = self.disk.get(key)
+            if cached is not None:
+                data, output_format = cached
+                cached = base64.b64encode(data).decode('utf-8'), output_format
+                self.memory.put(key, *cached)
+        return cached
+
+    def put(self, key: str, data: bytes, output_format: str):
+        """Store encoded bytes in both tiers."""
+        self.disk.put(key, data, output_format)
+        self.memory.put(key, base64.b64encode(data).decode('utf-8'), output_format)
+
+    def __call__(self, *args, **kwargs) -> str:
+        """Same arguments and result as generate_freq_image."""
+        arguments = canonical_arguments(*args, **kwargs)
+        cached = self.memory.get(cache_key(arguments))
+        if cached is None:
+            # The disk tier outlives asset deploys, so it is only read and written with a fresh fingerprint
+            cached = self.get(cache_key(arguments, refresh=True))
+        if cached is None:
+            key, data, output_format = render_for_cache(arguments)
+            if key is not None:
+                self.put(key, data, output_format)
+            cached = base64.b64encode(data).decode('utf-8'), output_format
+        image_base64, output_format = cached
+        if arguments['output_path'] is not None:
+            write_cached_output(arguments['output_path'], base64.b64decode(image_base64), output_format)
+        return image_base64
+
+
+def read_manifest(manifest_path: str, errors: dict = None) -> dict:
+    """Read a JSONL manifest of generate_freq_image argument dicts, keyed by line number (blank lines ignored).
+
+    Lines that are not valid JSON raise ValueError, unless errors is given:
+    they are then recorded there (line number -> message) and skipped.
+    """
+    specs = {}
+    with open(manifest_path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                specs[line_number] = json.loads(line)
+            except ValueError as e:
+                if errors is None:
+                    raise ValueError(f"{manifest_path}:{line_number}: {e}") from e
+                errors[line_number] = f"{type(e).__name__}: {e}"
+    return specs
+
+
+def warm_cache(cache, specs, workers: int = None, executor: str = "process", assets_dir: str = "assets",
+               errors: dict = None) -> dict:
+    """Render every spec missing from cache in parallel and store it.
+
+    cache is a DiskRenderCache or a TwoTierRenderCache. specs is a dict of
+    label -> spec (read_manifest labels them with their line number) or a
+    list, labelled by 1-based position. Specs without assets_dir use
+    assets_dir; output_path is ignored. errors holds specs already rejected
+    (label -> message, e.g. from read_manifest) and is copied into the report.
+
+    Returns a report: number of specs, of invalid specs (unreadable or with
+    wrong arguments), of distinct cards, how many were already cached,
+    rendered and failed, the errors keyed by the label of every invalid spec
+    or spec of a failed card, the final coverage (fraction of distinct cards
+    cached) and the elapsed time.
+    """
+    start = time.perf_counter()
+    if not isinstance(specs, dict):
+        specs = dict(enumerate(specs, 1))
+    errors = dict(errors or {})
+    unreadable = invalid = len(errors)
+    missing = {}
+    labels = {}  # cache key -> labels of the specs rendering that card
+    for label, spec in specs.items():
+        try:
+            arguments = canonical_arguments(**{'assets_dir': assets_dir, **spec})
+        except TypeError as e:
+            errors[label] = f"{type(e).__name__}: {e}"
+            invalid += 1
+            continue
+        arguments.pop('output_path')
+        key = cache_key(arguments, refresh=True)
+        missing.setdefault(key, arguments)
+        labels.setdefault(key, []).append(label)
+    total = len(missing)
+    missing = {key: arguments for key, arguments in missing.items() if key not in cache}
+    already_cached = total - len(missing)
+
+    rendered = 0
+    if missing:
+        assets_dirs = {arguments['assets_dir'] for arguments in missing.values()}
+        with RenderPool(workers, executor=executor, preload=sorted(assets_dirs)) as pool:
+            futures = {pool.submit(arguments): key for key, arguments in missing.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    data = base64.b64decode(future.result())
+                except Exception as e:
+                    for label in labels[key]:
+                        errors[label] = f"{type(e).__name__}: {e}"
+                    continue
+                if cache_key(missing[key], refresh=True) != key:
+                    for label in labels[key]:
+                        errors[label] = "Assets changed during warm-up; card not stored"
+                    continue
+                with Image.open(BytesIO(data)) as image:
+                    output_format = image.format
+                cache.put(key, data, output_format)
+                rendered += 1
+
+    return {
+        'specs': len(specs) + unreadable,
+        'invalid': invalid,
+        'cards': total,
+        'already_cached': already_cached,
+        'rendered': rendered,
+        'failed': total - already_cached - rendered,
+        'errors': errors,
+        'coverage': (already_cached + rendered) / total if total else 1.0,
+        'seconds': time.perf_counter() - start,
+    }
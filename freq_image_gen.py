@@ -1,169 +1,822 @@
 import os
 import base64
+import glob
+import json
+import logging
+import math
+import mmap
 import random
+import struct
+import threading
+import time
+import weakref
+from collections import deque
+from functools import cached_property, lru_cache
 from io import BytesIO
 from PIL import Image, ImageDraw, ImageFont
 from typing import List
 from typing import Tuple
+from typing import NamedTuple
 
-def generate_freq_image(frequency: str, scene_genre: str, scene_name: str, 
-                       radio_station_name: str, verbatims: List[str], tags: List[str], artists: List[str],
-                       output_path: str = None, assets_dir: str = "assets") -> str:
+# Maximum number of parsed (path, size) fonts kept in memory per process.
+# A render uses 6 distinct pairs, so this leaves plenty of room for variants.
+FONT_CACHE_SIZE = 32
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def _load_truetype(font_path: str, size: int) -> ImageFont.FreeTypeFont:
+    """Parse a font file once per (path, size); lru_cache is thread-safe."""
+    return ImageFont.truetype(font_path, size)
+
+
+def load_font(font_path: str, size: int):
+    """Load a font with fallback to default if not found.
+
+    Parsed fonts are shared process-wide, so repeated renders never reopen
+    the font files. Failed loads are not cached: the fallback is returned
+    and the file is tried again on the next call.
     """
-    Génère une image, avec informations de fréquence, genre, nom de scène, radio et différents types de pills.
+    try:
+        return _load_truetype(font_path, size)
+    except (OSError, IOError):
+        return ImageFont.load_default()
 
-    Arguments :
-        frequency : (str) Fréquence à afficher (ex: "97.3")
-        scene_genre : (str) Genre musical de la scène (ex: "House solaire")
-        scene_name : (str) Nom de la scène ("Le Refuge" ou "L'Atrium")
-        radio_station_name : (str) Nom de la radio ou de la programmation
-        verbatims : (List[str]) Liste de verbatims (fond gris)
-        tags : (List[str]) Liste de tags (fond blanc)
-        artists : (List[str]) Liste d'artistes (fond coloré selon la scène)
-        output_path : (str, optionnel) Chemin de sauvegarde de l'image générée. Si None, un nom par défaut est utilisé.
-        assets_dir : (str, optionnel) Dossier contenant les assets (images et polices). Par défaut "assets".
 
-    Returns :
-        str : Image encodée en base64
+def font_cache_info():
+    """Return hits, misses, maxsize and currsize of the font cache."""
+    return _load_truetype.cache_info()
+
+
+def clear_font_cache():
+    """Drop every parsed font, e.g. after replacing files in assets_dir."""
+    _load_truetype.cache_clear()
+
+
+def write_file_atomic(path: str, data: bytes):
+    """Write data to path through a temporary file and a rename, so readers never see a partial file."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+# Raw RGBA sidecar format written next to each PNG asset (orange.png -> orange.rgba):
+# magic, width, height, source PNG mtime_ns and size, then width*height*4 pixel bytes.
+RAW_ASSET_SUFFIX = ".rgba"
+RAW_ASSET_MAGIC = b"FQRGBA01"
+RAW_ASSET_HEADER = struct.Struct("<8sIIQQ")
+
+
+def raw_asset_path(image_path: str) -> str:
+    """Return the raw RGBA sidecar path for a PNG asset."""
+    return os.path.splitext(image_path)[0] + RAW_ASSET_SUFFIX
+
+
+def build_raw_asset(image_path: str) -> str:
+    """Decode a PNG asset once and write its raw RGBA sidecar atomically."""
+    stat = os.stat(image_path)
+    with Image.open(image_path) as image:
+        image = image.convert("RGBA")
+    header = RAW_ASSET_HEADER.pack(RAW_ASSET_MAGIC, image.width, image.height,
+                                   stat.st_mtime_ns, stat.st_size)
+    raw_path = raw_asset_path(image_path)
+    write_file_atomic(raw_path, header + image.tobytes())
+    return raw_path
+
+
+def build_raw_assets(assets_dir: str = "assets") -> List[str]:
+    """Write raw RGBA sidecars for every PNG in assets_dir."""
+    return [build_raw_asset(path) for path in sorted(glob.glob(os.path.join(assets_dir, "*.png")))]
+
+
+def _map_raw_asset(image_path: str, mtime_ns: int, file_size: int):
+    """Map the raw sidecar of image_path, or return None if missing or stale.
+
+    The pixels are wrapped zero-copy, so every process rendering from the
+    same sidecar shares its page-cache pages.
+    """
+    try:
+        with open(raw_asset_path(image_path), "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(mapped) < RAW_ASSET_HEADER.size:
+        mapped.close()
+        return None
+    magic, width, height, src_mtime_ns, src_size = RAW_ASSET_HEADER.unpack_from(mapped)
+    if (magic != RAW_ASSET_MAGIC or (src_mtime_ns, src_size) != (mtime_ns, file_size)
+            or len(mapped) != RAW_ASSET_HEADER.size + width * height * 4):
+        mapped.close()
+        return None
+    pixels = memoryview(mapped)[RAW_ASSET_HEADER.size:]
+    return Image.frombuffer("RGBA", (width, height), pixels, "raw", "RGBA", 0, 1)
+
+
+# Decoded backgrounds kept per process. Entries are keyed by file fingerprint,
+# so a replaced asset is decoded again instead of served stale.
+BACKGROUND_CACHE_SIZE = 8
+
+
+@lru_cache(maxsize=BACKGROUND_CACHE_SIZE)
+def _decode_background(image_path: str, mtime_ns: int, file_size: int) -> Image.Image:
+    """Decode a background once per (path, mtime, size) fingerprint."""
+    mapped = _map_raw_asset(image_path, mtime_ns, file_size)
+    if mapped is not None:
+        return mapped
+    with Image.open(image_path) as image:
+        image.load()
+        return image.copy()
+
+
+def load_background(image_path: str) -> Image.Image:
+    """Return a private, drawable copy of a cached decoded background.
+
+    A matching raw RGBA sidecar (see build_raw_assets) is memory-mapped
+    instead of decoding the PNG.
+    """
+    try:
+        stat = os.stat(image_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Background image not found: {image_path}")
+    return _decode_background(image_path, stat.st_mtime_ns, stat.st_size).copy()
+
+
+def background_cache_info():
+    """Return hits, misses, maxsize and currsize of the background cache."""
+    return _decode_background.cache_info()
+
+
+def clear_background_cache():
+    """Drop every decoded background and cached background size."""
+    _decode_background.cache_clear()
+    _read_background_size.cache_clear()
+
+
+# Characters whose advance widths are measured up front for each font:
+# printable Latin-1 and Latin Extended-A, which covers French text.
+PRELOADED_GLYPHS = "".join(chr(c) for c in range(0x20, 0x7F)) + "".join(chr(c) for c in range(0xA0, 0x180))
+
+# Per-font lookup tables (advances, glyph masks, word metrics), dropped
+# together with the font object.
+_font_tables = weakref.WeakKeyDictionary()
+_font_tables_lock = threading.Lock()
+
+
+def _font_table(font, table_type):
+    """Return the shared table_type(font) instance of a font, creating it on first use."""
+    tables = _font_tables.get(font)
+    if tables is None or table_type not in tables:
+        with _font_tables_lock:
+            tables = _font_tables.setdefault(font, {})
+            if table_type not in tables:
+                tables[table_type] = table_type(font)
+    return tables[table_type]
+
+
+def clear_font_tables(font=None, table_types=None):
+    """Drop the per-font tables of font (of every font if None), or only those of table_types.
+
+    Tables are rebuilt on next use; mostly useful to measure cold renders.
+    """
+    with _font_tables_lock:
+        fonts = [font] if font is not None else list(_font_tables.keys())
+        for table_font in fonts:
+            tables = _font_tables.get(table_font)
+            if tables is None:
+                continue
+            if table_types is None:
+                del _font_tables[table_font]
+            else:
+                for table_type in table_types:
+                    tables.pop(table_type, None)
+
+
+class GlyphAdvances(dict):
+    """Per-font table of single-character advance widths (font.getlength).
+
+    Characters outside PRELOADED_GLYPHS are measured on first use.
+    """
+
+    def __init__(self, font):
+        super().__init__((char, font.getlength(char)) for char in PRELOADED_GLYPHS)
+        self.font = font
+
+    def __missing__(self, char):
+        width = self[char] = self.font.getlength(char)
+        return width
+
+
+def glyph_advances(font) -> GlyphAdvances:
+    """Return the shared advance table of a font, building it on first use."""
+    return _font_table(font, GlyphAdvances)
+
+
+def tracked_text_width(text, font, tracking):
+    """Width of text drawn by draw_text_with_tracking, without trailing tracking."""
+    if not text:
+        return 0
+    advances = glyph_advances(font)
+    return sum(advances[char] + tracking for char in text[:-1]) + advances[text[-1]]
+
+
+class GlyphAtlas(dict):
+    """Per-font cache of rasterized glyph masks.
+
+    Keys are (char, mode, start) where start is the fractional part of the
+    drawing position, since FreeType renders sub-pixel offsets differently.
+    Values are the (mask, offset) pair returned by font.getmask2.
+    """
+
+    def __init__(self, font):
+        super().__init__()
+        self.font = font
+
+    def __missing__(self, key):
+        char, mode, start = key
+        glyph = self[key] = self.font.getmask2(char, mode, start=start)
+        return glyph
+
+
+def glyph_atlas(font) -> GlyphAtlas:
+    """Return the shared glyph atlas of a font, creating it on first use."""
+    return _font_table(font, GlyphAtlas)
+
+
+def draw_text_with_tracking(draw, position, text, font, fill, tracking):
+    """Draw text with custom letter spacing.
+
+    Glyph masks come from the font's GlyphAtlas, so each (char, sub-pixel
+    offset) is rasterized once per process and then only composited, the
+    same way ImageDraw.text composites a freshly rendered mask.
     """
-    # Helper functions 
-    def draw_text_with_tracking(draw, position, text, font, fill, tracking):
-        """Draw text with custom letter spacing."""
-        x, y = position
+    advances = glyph_advances(font)
+    x, y = position
+    if not isinstance(font, ImageFont.FreeTypeFont):
         for char in text:
             draw.text((x, y), char, fill=fill, font=font)
-            x += font.getlength(char) + tracking
+            x += advances[char] + tracking
+        return
 
-    def draw_wrapped_text(draw, text, font, fill, pos, max_width, line_spacing=8, tracking=None, max_lines=None):
-        """Draw text with word wrapping."""
-        words = text.split()
-        lines = []
-        current_line = []
-        
-        for word in words:
-            test_line = ' '.join(current_line + [word])
-            test_width = font.getbbox(test_line)[2] - font.getbbox(test_line)[0]
-            
-            if test_width <= max_width:
-                current_line.append(word)
-            else:
-                if current_line:
-                    lines.append(' '.join(current_line))
-                    current_line = [word]
-                else:
-                    lines.append(word)
-        
+    atlas = glyph_atlas(font)
+    ink, fill_ink = draw._getink(fill)
+    if ink is None:
+        ink = fill_ink
+    if ink is None:
+        return
+    for char in text:
+        mask, offset = atlas[char, draw.fontmode, (math.modf(x)[0], math.modf(y)[0])]
+        draw.draw.draw_bitmap((int(x) + offset[0], int(y) + offset[1]), mask, ink)
+        x += advances[char] + tracking
+
+
+# Text bounding boxes kept per font before the table is reset.
+TEXT_BOXES_SIZE = 4096
+
+# Word metric entries kept per font before the table is reset.
+WORD_METRICS_SIZE = 4096
+
+# Estimated line widths closer than this to max_width (in px) are checked
+# with a real getbbox call, so rounding can never change a line break.
+WRAP_EXACT_MARGIN = 2
+
+
+class TextBoxes(dict):
+    """Per-font cache of font.getbbox results, which cost a FreeType layout each."""
+
+    def __init__(self, font):
+        super().__init__()
+        self.font = font
+
+    def __missing__(self, text):
+        if len(self) >= TEXT_BOXES_SIZE:
+            self.clear()
+        bbox = self[text] = self.font.getbbox(text)
+        return bbox
+
+
+def text_bbox(text, font):
+    """Return font.getbbox(text), cached per font."""
+    return _font_table(font, TextBoxes)[text]
+
+
+class WordMetrics(dict):
+    """Per-font cache of (advance, bbox left, bbox right) for single words."""
+
+    def __init__(self, font):
+        super().__init__()
+        self.font = font
+
+    def __missing__(self, word):
+        if len(self) >= WORD_METRICS_SIZE:
+            self.clear()
+        left, _, right, _ = text_bbox(word, self.font)
+        metrics = self[word] = (self.font.getlength(word), left, right)
+        return metrics
+
+
+def word_metrics(font) -> WordMetrics:
+    """Return the shared word metrics table of a font."""
+    return _font_table(font, WordMetrics)
+
+
+def wrap_words(text, font, max_width):
+    """Split text into lines whose getbbox width fits max_width.
+
+    Each word and the space are measured once; the width of a candidate
+    line is the pen position of its last word plus that word's bbox right
+    edge, minus the first word's bbox left edge, accumulated as words are
+    added. Lines break exactly where joining and measuring every candidate
+    line would.
+    """
+    metrics = word_metrics(font)
+    space_width = glyph_advances(font)[' ']
+    lines = []
+    current_line = []
+    line_left = 0
+    pen = 0
+
+    for word in text.split():
+        advance, left, right = metrics[word]
         if current_line:
-            lines.append(' '.join(current_line))
-        
-        # Truncate to max_lines if specified
-        if max_lines and len(lines) > max_lines:
-            lines = lines[:max_lines]
-            # Add ellipsis to the last line if truncated
-            last_line = lines[-1]
-            while True:
-                test_line = last_line + '...'
-                test_width = font.getbbox(test_line)[2] - font.getbbox(test_line)[0]
-                if test_width <= max_width or len(last_line) <= 3:
-                    lines[-1] = (last_line, '...')  # Store as tuple to indicate ellipsis
-                    break
-                last_line = last_line[:-1]
-        
-        for i, line in enumerate(lines):
-            line_pos = (pos[0], pos[1] + i * (font.size + line_spacing))
-            if isinstance(line, tuple):
-                # Handle line with ellipsis (no tracking for ellipsis)
-                text_part, ellipsis = line
-                if tracking is not None:
-                    draw_text_with_tracking(draw, line_pos, text_part, font, fill, tracking)
-                    # Calculate position for ellipsis after the tracked text
-                    text_width = sum(font.getlength(char) + tracking for char in text_part[:-1]) + font.getlength(text_part[-1]) if text_part else 0
-                    ellipsis_pos = (line_pos[0] + text_width, line_pos[1])
-                    draw.text(ellipsis_pos, ellipsis, fill=fill, font=font)
-                else:
-                    draw.text(line_pos, text_part + ellipsis, fill=fill, font=font)
-            elif tracking is not None:
-                draw_text_with_tracking(draw, line_pos, line, font, fill, tracking)
+            word_x = pen + space_width
+            test_width = word_x + right - line_left
+            if abs(test_width - max_width) <= WRAP_EXACT_MARGIN:
+                bbox = text_bbox(' '.join(current_line + [word]), font)
+                test_width = bbox[2] - bbox[0]
+        else:
+            word_x = 0
+            test_width = right - left
+
+        if test_width <= max_width:
+            if not current_line:
+                line_left = left
+            current_line.append(word)
+            pen = word_x + advance
+        else:
+            if current_line:
+                lines.append(' '.join(current_line))
+                current_line = [word]
+                line_left = left
+                pen = advance
             else:
-                draw.text(line_pos, line, fill=fill, font=font)
-    
-    def draw_pill(draw, text, font, text_fill, pill_fill, pos=None, 
-                  relative_to=None, relative_to_text=None, relative_to_font=None,
-                  gap=0, offset=(0, 0), padding_x=40, pill_height=72):
-        """Draw a pill (rounded rectangle) with perfectly centered text."""
-        # Calculate pill dimensions
-        text_bbox = font.getbbox(text)
-        text_width = text_bbox[2] - text_bbox[0]
-        pill_width = text_width + 2 * padding_x
-        
-        # Calculate pill position
-        if pos is not None:
-            pill_x, pill_y = pos
-        elif relative_to and relative_to_text and relative_to_font:
-            ref_bbox = relative_to_font.getbbox(relative_to_text)
-            ref_width = ref_bbox[2] - ref_bbox[0]
-            ref_height = ref_bbox[3] - ref_bbox[1]
-            pill_x = relative_to[0] + ref_width + gap
-            pill_y = relative_to[1] + (ref_height - pill_height) // 2
-        elif relative_to:
-            pill_x, pill_y = relative_to
+                lines.append(word)
+
+    if current_line:
+        lines.append(' '.join(current_line))
+    return lines
+
+
+def bbox_width(text, font):
+    """Width of the bounding box of text."""
+    bbox = text_bbox(text, font)
+    return bbox[2] - bbox[0]
+
+
+def truncate_to_width(text, font, max_width, min_length=3, ellipsis='...'):
+    """Return the longest prefix of text that still fits max_width once ellipsis is appended.
+
+    Prefixes are never shortened below min_length characters: if none of
+    the longer ones fit, text[:min_length] is returned. The prefix is found
+    by binary search, so only O(log n) prefixes are measured.
+    """
+    low, high = min(min_length, len(text)), len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if bbox_width(text[:mid] + ellipsis, font) <= max_width:
+            low = mid
         else:
-            pill_x, pill_y = (0, 0)
-        
-        pill_x += offset[0]
-        pill_y += offset[1]
-        
-        # Draw the pill shape
-        draw.rounded_rectangle(
-            [pill_x, pill_y, pill_x + pill_width, pill_y + pill_height],
-            radius=pill_height // 2,
-            fill=pill_fill
-        )
-        
-        # Center text in pill
-        text_x = pill_x + (pill_width - text_width) // 2 - text_bbox[0]
-        
-        # Use font metrics for consistent vertical centering
-        ascent, descent = font.getmetrics()
-        baseline_y = pill_y + pill_height // 2 + descent // 2 + 7
-        text_y = baseline_y - ascent
-        
-        draw.text((text_x, text_y), text, fill=text_fill, font=font)
-        return (pill_x, pill_y, pill_x + pill_width, pill_y + pill_height)
+            high = mid - 1
+    return text[:low]
 
-    # Determine which background image to use
-    if scene_name.lower() == "l'atrium":
-        bg_image_path = os.path.join(assets_dir, "orange.png")
-    elif scene_name.lower() == "le refuge":
-        bg_image_path = os.path.join(assets_dir, "purple.png")
+
+class StageTimer:
+    """Wall and CPU time of the stages of one render.
+
+    reset() starts a stage, mark(name) ends it and records its times; a stage
+    marked several times accumulates. CPU time is the calling thread's.
+    """
+    __slots__ = ('stages', '_wall', '_cpu')
+
+    def __init__(self):
+        self.stages = {}
+        self.reset()
+
+    def reset(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+
+    def mark(self, stage: str):
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        previous_wall, previous_cpu = self.stages.get(stage, (0.0, 0.0))
+        self.stages[stage] = (previous_wall + wall - self._wall, previous_cpu + cpu - self._cpu)
+        self._wall = wall
+        self._cpu = cpu
+
+    def record(self) -> dict:
+        """Return {stage: {'wall_ms': ..., 'cpu_ms': ...}} in stage order."""
+        return {stage: {'wall_ms': wall * 1000, 'cpu_ms': cpu * 1000}
+                for stage, (wall, cpu) in self.stages.items()}
+
+    def emit(self):
+        """Send the record to the timing sink, if one is set."""
+        sink = _timing_sink
+        if sink is not None and self.stages:
+            sink(self.record())
+
+
+_timing_sink = None
+
+
+def set_timing_sink(sink):
+    """Enable per-stage timing of generate_freq_image, or disable it with None.
+
+    sink is called once per render with StageTimer.record() output; it can be
+    any callable, e.g. a TimingHistograms, a JsonLogSink or a plain function.
+    When no sink is set, no timer is created and the only cost is one check
+    per stage.
+    """
+    global _timing_sink
+    _timing_sink = sink
+
+
+def start_timer():
+    """Return a new StageTimer if a timing sink is set, None otherwise."""
+    return StageTimer() if _timing_sink is not None else None
+
+
+class TimingHistograms:
+    """Timing sink keeping the last max_samples wall/CPU samples per stage in memory.
+
+    Each stage has fixed-size ring buffers, so memory stays bounded in a
+    long-running process and percentiles describe the recent renders.
+    """
+
+    def __init__(self, max_samples: int = 1024):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.counts = {}
+
+    def __call__(self, record: dict):
+        with self._lock:
+            for stage, times in record.items():
+                stage_samples = self.samples.get(stage)
+                if stage_samples is None:
+                    stage_samples = self.samples[stage] = {'wall_ms': deque(maxlen=self.max_samples),
+                                                           'cpu_ms': deque(maxlen=self.max_samples)}
+                stage_samples['wall_ms'].append(times['wall_ms'])
+                stage_samples['cpu_ms'].append(times['cpu_ms'])
+                self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def summary(self, percentiles=(50, 95, 99)) -> dict:
+        """Return total count, window size and wall/CPU percentiles (nearest rank) over the window per stage."""
+        with self._lock:
+            summary = {}
+            for stage, stage_samples in self.samples.items():
+                stats = {'count': self.counts[stage], 'window': len(stage_samples['wall_ms'])}
+                for kind, values in stage_samples.items():
+                    values = sorted(values)
+                    for percentile in percentiles:
+                        index = min(len(values) - 1, max(0, math.ceil(percentile / 100 * len(values)) - 1))
+                        stats[f"{kind[:-3]}_p{percentile}_ms"] = values[index]
+                summary[stage] = stats
+            return summary
+
+    def clear(self):
+        with self._lock:
+            self.samples.clear()
+            self.counts.clear()
+
+
+class JsonLogSink:
+    """Timing sink logging one JSON line per render at INFO level."""
+
+    def __init__(self, logger: logging.Logger = None):
+        self.logger = logger or logging.getLogger("freq_image_gen.timing")
+
+    def __call__(self, record: dict):
+        self.logger.info(json.dumps({'event': 'freq_image_timing', 'stages': record}))
+
+
+class DisplayItem:
+    """Base class of display list entries produced by the layout stage."""
+    __slots__ = ()
+
+    def to_dict(self):
+        """Return a JSON-serializable dict; fonts become [path, size]."""
+        data = {'type': type(self).__name__}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            data[name] = _font_ref(value) if name == 'font' else value
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild an item from to_dict output, reloading fonts through load_font."""
+        item_type = DISPLAY_ITEM_TYPES[data['type']]
+        values = []
+        for name in item_type.__slots__:
+            value = data[name]
+            if name == 'font':
+                value = load_font(*value) if value else ImageFont.load_default()
+            elif isinstance(value, list):
+                value = tuple(value)
+            values.append(value)
+        return item_type(*values)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__ if name != 'font')
+        return f"{type(self).__name__}({fields})"
+
+
+def _font_ref(font):
+    """Return [path, size] for a font loaded from a file, None otherwise."""
+    path = getattr(font, 'path', None)
+    return [path, font.size] if isinstance(path, str) else None
+
+
+class TextRun(DisplayItem):
+    """A line of text at xy, drawn per glyph when tracking is set."""
+    __slots__ = ('text', 'xy', 'font', 'fill', 'tracking')
+
+    def __init__(self, text, xy, font, fill, tracking=None):
+        self.text = text
+        self.xy = xy
+        self.font = font
+        self.fill = fill
+        self.tracking = tracking
+
+    def draw(self, draw):
+        if self.tracking is None:
+            draw.text(self.xy, self.text, fill=self.fill, font=self.font)
+        else:
+            draw_text_with_tracking(draw, self.xy, self.text, self.font, self.fill, self.tracking)
+
+
+class PillShape(DisplayItem):
+    """A rounded rectangle with its centered label."""
+    __slots__ = ('box', 'radius', 'fill', 'text', 'text_xy', 'font', 'text_fill')
+
+    def __init__(self, box, radius, fill, text, text_xy, font, text_fill):
+        self.box = box
+        self.radius = radius
+        self.fill = fill
+        self.text = text
+        self.text_xy = text_xy
+        self.font = font
+        self.text_fill = text_fill
+
+    def draw(self, draw):
+        draw.rounded_rectangle(list(self.box), radius=self.radius, fill=self.fill)
+        draw.text(self.text_xy, self.text, fill=self.text_fill, font=self.font)
+
+
+DISPLAY_ITEM_TYPES = {cls.__name__: cls for cls in (TextRun, PillShape)}
+
+
+class Layout:
+    """Display list of a card plus the truncation decisions taken while laying it out.
+
+    Attributes :
+        size : (width, height) of the background
+        background_path : background image the items are drawn on
+        items : TextRun / PillShape entries, in drawing order
+        station_lines : radio station lines as displayed (ellipsis included)
+        station_truncated : True if the station name did not fit in its max lines
+        pills : (type, text, display_text) of every drawn pill, in drawing order
+        dropped_pills : (type, text) of the pills that did not fit in the max lines
+        stages : (name, item count) of the drawing steps the items belong to, in order
+    """
+    __slots__ = ('size', 'background_path', 'items', 'station_lines', 'station_truncated',
+                 'pills', 'dropped_pills', 'stages')
+
+    def __init__(self, size, background_path, items, station_lines=(), station_truncated=False,
+                 pills=(), dropped_pills=(), stages=None):
+        self.size = size
+        self.background_path = background_path
+        self.items = items
+        self.station_lines = station_lines
+        self.station_truncated = station_truncated
+        self.pills = pills
+        self.dropped_pills = dropped_pills
+        self.stages = stages if stages is not None else [('items', len(items))]
+
+    @property
+    def truncated_pills(self):
+        """(type, text, display_text) of the drawn pills whose text was shortened."""
+        return [pill for pill in self.pills if pill[1] != pill[2]]
+
+    def to_dict(self):
+        """Return a JSON-serializable dict of the layout."""
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['items'] = [item.to_dict() for item in self.items]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a layout from to_dict output."""
+        data = dict(data)
+        data['size'] = tuple(data['size'])
+        data['items'] = [DisplayItem.from_dict(item) for item in data['items']]
+        data['pills'] = [tuple(pill) for pill in data['pills']]
+        data['dropped_pills'] = [tuple(pill) for pill in data['dropped_pills']]
+        data['stages'] = [tuple(stage) for stage in data['stages']]
+        return cls(**data)
+
+    def __eq__(self, other):
+        return isinstance(other, Layout) and self.to_dict() == other.to_dict()
+
+
+def layout_wrapped_text(text, font, fill, pos, max_width, line_spacing=8, tracking=None, max_lines=None):
+    """Lay out text with word wrapping.
+
+    Returns the TextRun list, the lines as displayed (ellipsis included)
+    and whether lines were cut at max_lines.
+    """
+    lines = wrap_words(text, font, max_width)
+    truncated = bool(max_lines) and len(lines) > max_lines
+
+    # Truncate to max_lines if specified
+    if truncated:
+        lines = lines[:max_lines]
+        # Add ellipsis to the last line if truncated
+        last_line = truncate_to_width(lines[-1], font, max_width)
+        lines[-1] = (last_line, '...')  # Store as tuple to indicate ellipsis
+
+    runs = []
+    for i, line in enumerate(lines):
+        line_pos = (pos[0], pos[1] + i * (font.size + line_spacing))
+        if isinstance(line, tuple):
+            # Handle line with ellipsis (no tracking for ellipsis)
+            text_part, ellipsis = line
+            if tracking is not None:
+                runs.append(TextRun(text_part, line_pos, font, fill, tracking))
+                # Calculate position for ellipsis after the tracked text
+                text_width = tracked_text_width(text_part, font, tracking)
+                ellipsis_pos = (line_pos[0] + text_width, line_pos[1])
+                runs.append(TextRun(ellipsis, ellipsis_pos, font, fill))
+            else:
+                runs.append(TextRun(text_part + ellipsis, line_pos, font, fill))
+        else:
+            runs.append(TextRun(line, line_pos, font, fill, tracking))
+    display_lines = [''.join(line) if isinstance(line, tuple) else line for line in lines]
+    return runs, display_lines, truncated
+
+
+def draw_wrapped_text(draw, text, font, fill, pos, max_width, line_spacing=8, tracking=None, max_lines=None):
+    """Draw text with word wrapping."""
+    runs, _, _ = layout_wrapped_text(text, font, fill, pos, max_width, line_spacing, tracking, max_lines)
+    for run in runs:
+        run.draw(draw)
+
+
+def layout_pill(text, font, text_fill, pill_fill, pos=None,
+                relative_to=None, relative_to_text=None, relative_to_font=None,
+                gap=0, offset=(0, 0), padding_x=40, pill_height=72):
+    """Lay out a pill (rounded rectangle) with perfectly centered text."""
+    # Calculate pill dimensions
+    bbox = text_bbox(text, font)
+    text_width = bbox[2] - bbox[0]
+    pill_width = text_width + 2 * padding_x
+
+    # Calculate pill position
+    if pos is not None:
+        pill_x, pill_y = pos
+    elif relative_to and relative_to_text and relative_to_font:
+        ref_bbox = text_bbox(relative_to_text, relative_to_font)
+        ref_width = ref_bbox[2] - ref_bbox[0]
+        ref_height = ref_bbox[3] - ref_bbox[1]
+        pill_x = relative_to[0] + ref_width + gap
+        pill_y = relative_to[1] + (ref_height - pill_height) // 2
+    elif relative_to:
+        pill_x, pill_y = relative_to
     else:
+        pill_x, pill_y = (0, 0)
+
+    pill_x += offset[0]
+    pill_y += offset[1]
+
+    # Center text in pill
+    text_x = pill_x + (pill_width - text_width) // 2 - bbox[0]
+
+    # Use font metrics for consistent vertical centering
+    ascent, descent = font.getmetrics()
+    baseline_y = pill_y + pill_height // 2 + descent // 2 + 7
+    text_y = baseline_y - ascent
+
+    return PillShape((pill_x, pill_y, pill_x + pill_width, pill_y + pill_height), pill_height // 2,
+                     pill_fill, text, (text_x, text_y), font, text_fill)
+
+
+def draw_pill(draw, text, font, text_fill, pill_fill, pos=None, 
+              relative_to=None, relative_to_text=None, relative_to_font=None,
+              gap=0, offset=(0, 0), padding_x=40, pill_height=72):
+    """Draw a pill (rounded rectangle) with perfectly centered text."""
+    pill = layout_pill(text, font, text_fill, pill_fill, pos, relative_to, relative_to_text,
+                       relative_to_font, gap, offset, padding_x, pill_height)
+    pill.draw(draw)
+    return pill.box
+
+
+@lru_cache(maxsize=BACKGROUND_CACHE_SIZE)
+def _read_background_size(image_path: str, mtime_ns: int, file_size: int) -> Tuple[int, int]:
+    """Read the size of an image from its header, once per fingerprint."""
+    with Image.open(image_path) as image:
+        return image.size
+
+
+def background_size(image_path: str) -> Tuple[int, int]:
+    """Return (width, height) of a background without decoding its pixels."""
+    try:
+        stat = os.stat(image_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Background image not found: {image_path}")
+    return _read_background_size(image_path, stat.st_mtime_ns, stat.st_size)
+
+
+# Default seed of the pill shuffle, so a given card always looks the same.
+PILL_SHUFFLE_SEED = 420
+
+# Background image of each scene, by lowercase scene name.
+SCENE_BACKGROUNDS = {
+    "l'atrium": "orange.png",
+    "le refuge": "purple.png",
+}
+
+# Font file and size of each text element of a card.
+CARD_FONTS = {
+    'frequency': ("Obviously-MediumItalic.otf", 174),
+    'scene_genre': ("DarkerGrotesque-SemiBold.ttf", 60),
+    'scene_name': ("DarkerGrotesque-ExtraBold.ttf", 54),
+    'date': ("DarkerGrotesque-ExtraBold.ttf", 69),
+    'radio_station': ("Obviously-MediumItalic.otf", 127),
+    'tags': ("DarkerGrotesque-ExtraBold.ttf", 42),
+}
+
+
+def card_fonts(assets_dir: str = "assets") -> dict:
+    """Load the fonts of CARD_FONTS from assets_dir, keyed like CARD_FONTS."""
+    return {name: load_font(os.path.join(assets_dir, file_name), size)
+            for name, (file_name, size) in CARD_FONTS.items()}
+
+
+def preload_assets(assets_dir: str = "assets"):
+    """Parse every card font and decode every background into the process caches.
+
+    Meant for worker start-up, so the first render in a worker does not pay
+    for asset loading.
+    """
+    for font in card_fonts(assets_dir).values():
+        glyph_advances(font)
+    for file_name in SCENE_BACKGROUNDS.values():
+        image_path = os.path.join(assets_dir, file_name)
+        stat = os.stat(image_path)
+        _decode_background(image_path, stat.st_mtime_ns, stat.st_size)
+        background_size(image_path)
+
+
+def layout_freq_image(frequency: str, scene_genre: str, scene_name: str,
+                      radio_station_name: str, verbatims: List[str], tags: List[str], artists: List[str],
+                      assets_dir: str = "assets", seed: int = PILL_SHUFFLE_SEED,
+                      timer: "StageTimer" = None) -> Layout:
+    """
+    Calcule la mise en page d'une image de fréquence sans la dessiner (voir generate_freq_image).
+    Si timer est fourni, les temps du chargement des assets et de la mise en page y sont enregistrés.
+
+    Returns :
+        Layout : Display list et décisions de troncature, à rejouer avec render_layout
+    """
+    # Determine which background image to use
+    if scene_name.lower() not in SCENE_BACKGROUNDS:
         raise ValueError(f"Unknown scene_name: {scene_name}. Must be 'Le Refuge' or 'L'Atrium'")
+    bg_image_path = os.path.join(assets_dir, SCENE_BACKGROUNDS[scene_name.lower()])
     
-    # Check if background image exists
-    if not os.path.exists(bg_image_path):
-        raise FileNotFoundError(f"Background image not found: {bg_image_path}")
-    
-    # Open the background image
-    image = Image.open(bg_image_path)
-    draw = ImageDraw.Draw(image)
+    if timer:
+        timer.reset()
     
-    # Load fonts
-    def load_font(font_path, size):
-        """Load a font with fallback to default if not found."""
-        try:
-            return ImageFont.truetype(font_path, size)
-        except (OSError, IOError):
-            return ImageFont.load_default()
+    # Get image dimensions (header only, pixels are decoded by render_layout)
+    width, height = background_size(bg_image_path)
     
-    frequency_font = load_font(os.path.join(assets_dir, "Obviously-MediumItalic.otf"), 174)
-    scene_genre_font = load_font(os.path.join(assets_dir, "DarkerGrotesque-SemiBold.ttf"), 60)
-    scene_name_font = load_font(os.path.join(assets_dir, "DarkerGrotesque-ExtraBold.ttf"), 54)
-    date_font = load_font(os.path.join(assets_dir, "DarkerGrotesque-ExtraBold.ttf"), 69)
-    radio_station_font = load_font(os.path.join(assets_dir, "Obviously-MediumItalic.otf"), 127)
-    tags_font = load_font(os.path.join(assets_dir, "DarkerGrotesque-ExtraBold.ttf"), 42)
+    # Load fonts (cached process-wide, see load_font)
+    fonts = card_fonts(assets_dir)
+    frequency_font = fonts['frequency']
+    scene_genre_font = fonts['scene_genre']
+    scene_name_font = fonts['scene_name']
+    date_font = fonts['date']
+    radio_station_font = fonts['radio_station']
+    tags_font = fonts['tags']
+    if timer:
+        timer.mark('load_assets')
     
-    # Get image dimensions
-    width, height = image.size
     # Colors
     WHITE = (255, 255, 255, 255)
     BLACK = (0, 0, 0, 255)
@@ -175,28 +828,36 @@ def generate_freq_image(frequency: str, scene_genre: str, scene_name: str,
     elif scene_name.lower() == "le refuge":
         pill_bg_color = (182, 140, 254, 255)
     
-    # Draw all elements
+    items = []
+    stages = []
     # 1. Frequency
-    draw_text_with_tracking(draw, (66, 311), f"{frequency} FM", 
-                           frequency_font, WHITE, tracking=-8)
+    items.append(TextRun(f"{frequency} FM", (66, 311), frequency_font, WHITE, tracking=-8))
+    stages.append(('frequency', 1))
     
     # 2. Scene genre text
     scene_genre_text = f"{scene_genre} dans"
     scene_genre_pos = (66, 460)
-    draw.text(scene_genre_pos, scene_genre_text, fill=BLACK, font=scene_genre_font)
+    items.append(TextRun(scene_genre_text, scene_genre_pos, scene_genre_font, BLACK))
+    stages.append(('scene_genre', 1))
     
     # 3. Scene name pill (next to genre text)
-    draw_pill(draw, scene_name, scene_name_font, BLACK, pill_bg_color,
-              relative_to=scene_genre_pos, relative_to_text=scene_genre_text, 
-              relative_to_font=scene_genre_font, gap=24, offset=(0, 32),
-              padding_x=25, pill_height=72)
+    items.append(layout_pill(scene_name, scene_name_font, BLACK, pill_bg_color,
+                             relative_to=scene_genre_pos, relative_to_text=scene_genre_text,
+                             relative_to_font=scene_genre_font, gap=24, offset=(0, 32),
+                             padding_x=25, pill_height=72))
+    stages.append(('scene_name', 1))
     
     # 4. Date
-    draw.text((66, 520), "le 31 juillet à La Rotonde", fill=BLACK, font=date_font)
+    items.append(TextRun("le 31 juillet à La Rotonde", (66, 520), date_font, BLACK))
+    stages.append(('date', 1))
     
     # 5. Radio station name (with wrapping, max 3 lines)
-    draw_wrapped_text(draw, radio_station_name, radio_station_font, WHITE,
-                     (66, 800), max_width=width-200, line_spacing=8, tracking=-7, max_lines=3)
+    station_runs, station_lines, station_truncated = layout_wrapped_text(
+        radio_station_name, radio_station_font, WHITE, (66, 800), max_width=width-200,
+        line_spacing=8, tracking=-7, max_lines=3)
+    items.extend(station_runs)
+    stages.append(('radio_station', len(station_runs)))
+
     # 6. Mixed pills (verbatims, tags, artists) across max 4 lines
     all_pills = []
     
@@ -213,9 +874,12 @@ def generate_freq_image(frequency: str, scene_genre: str, scene_name: str,
         all_pills.append(('artist', artist, pill_bg_color))
     
     # Mix the pills randomly with a fixed seed for reproducibility
-    random.seed(420)
-    random.shuffle(all_pills)
+    # (private generator: the global random state is left untouched and
+    # concurrent renders cannot interfere with each other)
+    random.Random(seed).shuffle(all_pills)
     
+    placed_pills = []
+    placed_count = 0
     if all_pills:
         pill_start_x = 66
         pill_start_y = 1300
@@ -232,7 +896,7 @@ def generate_freq_image(frequency: str, scene_genre: str, scene_name: str,
         
         for pill_type, pill_text, pill_bg in all_pills:
             # Calculate pill width
-            text_width = tags_font.getbbox(pill_text)[2] - tags_font.getbbox(pill_text)[0]
+            text_width = bbox_width(pill_text, tags_font)
             pill_width = text_width + 50  # 25px padding on each side
             
             # Check if this pill fits on current line
@@ -262,7 +926,7 @@ def generate_freq_image(frequency: str, scene_genre: str, scene_name: str,
         if current_line and len(lines) < max_lines:
             lines.append(current_line)
         
-        # Draw the pills
+        # Lay out the pills
         for line_num, line_pills in enumerate(lines):
             y = pill_start_y + line_num * (pill_height + pill_gap_y)
             x = pill_start_x
@@ -272,27 +936,326 @@ def generate_freq_image(frequency: str, scene_genre: str, scene_name: str,
                 display_text = pill_text
                 max_text_width = max_pill_right - x - 50  # Account for padding
                 
-                while (tags_font.getbbox(display_text)[2] - tags_font.getbbox(display_text)[0] > max_text_width 
-                       and len(display_text) > 6):
-                    display_text = display_text[:-4] + '...'
+                if len(display_text) > 6 and bbox_width(display_text, tags_font) > max_text_width:
+                    display_text = truncate_to_width(pill_text[:-4], tags_font, max_text_width) + '...'
                 
-                # Draw the pill
-                bbox = draw_pill(draw, display_text, tags_font, BLACK, pill_bg,
-                               pos=(x, y), padding_x=25, pill_height=pill_height)
+                pill = layout_pill(display_text, tags_font, BLACK, pill_bg,
+                                   pos=(x, y), padding_x=25, pill_height=pill_height)
+                items.append(pill)
+                placed_pills.append((pill_type, pill_text, display_text))
+                placed_count += 1
                 
                 # Move x position for next pill
-                x = bbox[2] + pill_gap_x
+                x = pill.box[2] + pill_gap_x
     
-    # Convert image to base64
+    stages.append(('pills', placed_count))
+    
+    dropped_pills = [(pill_type, pill_text) for pill_type, pill_text, _ in all_pills[placed_count:]]
+    if timer:
+        timer.mark('layout')
+    return Layout((width, height), bg_image_path, items, station_lines, station_truncated,
+                  placed_pills, dropped_pills, stages)
+
+
+def dry_run_freq_image(frequency: str, scene_genre: str, scene_name: str,
+                       radio_station_name: str, verbatims: List[str], tags: List[str], artists: List[str],
+                       assets_dir: str = "assets", seed: int = PILL_SHUFFLE_SEED) -> dict:
+    """
+    Vérifie le contenu d'une image sans la dessiner : seules les mesures de mise en page sont faites,
+    le fond n'est pas décodé et aucun PNG n'est encodé. Assez rapide pour être appelé à chaque frappe.
+
+    Arguments :
+        Mêmes arguments que generate_freq_image (sans output_path).
+
+    Returns :
+        dict :
+            overflow : (bool) True si du contenu est tronqué ou non affiché
+            station_lines : (List[str]) Lignes du nom de radio telles qu'affichées
+            station_truncated : (bool) True si le nom de radio dépasse 3 lignes
+            truncated_pills : (List[Tuple[str, str, str]]) (type, texte, texte affiché) des pills raccourcies
+            dropped_pills : (List[Tuple[str, str]]) (type, texte) des pills qui ne tiennent pas sur 4 lignes
+    """
+    layout = layout_freq_image(frequency, scene_genre, scene_name, radio_station_name,
+                               verbatims, tags, artists, assets_dir=assets_dir, seed=seed)
+    truncated_pills = layout.truncated_pills
+    return {
+        'overflow': bool(layout.station_truncated or truncated_pills or layout.dropped_pills),
+        'station_lines': layout.station_lines,
+        'station_truncated': layout.station_truncated,
+        'truncated_pills': truncated_pills,
+        'dropped_pills': layout.dropped_pills,
+    }
+
+
+def render_layout(layout: Layout, timer: "StageTimer" = None) -> Image.Image:
+    """Draw a layout's display list on a fresh copy of its background.
+
+    With a timer, the background copy and each drawing step are timed
+    separately (as load_background and draw_<step>).
+    """
+    if timer:
+        timer.reset()
+    image = load_background(layout.background_path)
+    draw = ImageDraw.Draw(image)
+    if timer:
+        timer.mark('load_background')
+    start = 0
+    for stage, count in layout.stages:
+        for item in layout.items[start:start + count]:
+            item.draw(draw)
+        start += count
+        if timer:
+            timer.mark(f'draw_{stage}')
+    return image
+
+
+# Encoders supported by encode_image, with their MIME type.
+OUTPUT_FORMATS = {
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+}
+
+
+def encode_image(image: Image.Image, output_format: str = 'PNG', encode_options: dict = None) -> bytes:
+    """Encode image in output_format, passing encode_options to Pillow's encoder.
+
+    Useful options: PNG compress_level (0-9), compress_type (zlib strategy,
+    e.g. zlib.Z_RLE) and optimize; WEBP lossless, quality and method; JPEG
+    quality, optimize and progressive. JPEG has no alpha channel, so the
+    image is converted to RGB first.
+    """
+    output_format = output_format.upper()
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output_format: {output_format}. Must be one of {', '.join(OUTPUT_FORMATS)}")
+    if output_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
     buffer = BytesIO()
-    image.save(buffer, format='PNG')
-    buffer.seek(0)
-    image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    image.save(buffer, format=output_format, **(encode_options or {}))
+    return buffer.getvalue()
+
+
+class BudgetedEncoding(NamedTuple):
+    """Result of encode_within_budget."""
+    data: bytes
+    output_format: str
+    encode_options: dict
+    attempts: int
+    elapsed: float
+
+
+# Lossy formats tried by encode_within_budget, in order of preference.
+BUDGET_FORMATS = ('WEBP', 'JPEG')
+
+
+def encode_within_budget(image: Image.Image, max_bytes: int, output_format: str = 'PNG',
+                         encode_options: dict = None, formats=BUDGET_FORMATS,
+                         min_quality: int = 10, max_quality: int = 95) -> BudgetedEncoding:
+    """Encode image in at most max_bytes.
+
+    The requested output_format/encode_options is tried first. If it is too
+    big, the quality of each lossy format in formats is bisected to find the
+    highest quality that fits; the first format with a fitting quality wins.
+    The same rendered image is reused for every attempt.
+
+    Raises ValueError if no format fits, even at min_quality.
+    """
+    start = time.perf_counter()
+    attempts = 1
+    data = encode_image(image, output_format, encode_options)
+    if len(data) <= max_bytes:
+        return BudgetedEncoding(data, output_format.upper(), encode_options or {}, attempts,
+                                time.perf_counter() - start)
+
+    smallest = len(data)
+    for lossy_format in formats:
+        # A format that does not fit at min_quality is skipped after one attempt
+        best = encode_image(image, lossy_format, {'quality': min_quality})
+        attempts += 1
+        smallest = min(smallest, len(best))
+        if len(best) > max_bytes:
+            continue
+        best_quality = min_quality
+        low, high = min_quality + 1, max_quality
+        while low <= high:
+            quality = (low + high) // 2
+            candidate = encode_image(image, lossy_format, {'quality': quality})
+            attempts += 1
+            if len(candidate) <= max_bytes:
+                best, best_quality = candidate, quality
+                low = quality + 1
+            else:
+                high = quality - 1
+        return BudgetedEncoding(best, lossy_format, {'quality': best_quality}, attempts,
+                                time.perf_counter() - start)
+
+    raise ValueError(f"Cannot encode image in {max_bytes} bytes (smallest attempt: {smallest} bytes)")
+
+
+def save_output(image: Image.Image, output_path: str, encoded: bytes = None, encoded_format: str = 'PNG'):
+    """Save image atomically to output_path.
+
+    encoded bytes (in encoded_format) are written as is when the extension of
+    output_path matches their format; otherwise the image is encoded again
+    with the format of the extension.
+    """
+    extension = os.path.splitext(output_path)[1].lower()
+    output_format = Image.registered_extensions().get(extension)
+    if output_format is None:
+        raise ValueError(f"Unknown file extension for output_path: {output_path}")
+    if encoded is not None and output_format == encoded_format.upper():
+        data = encoded
+    elif output_format in OUTPUT_FORMATS:
+        data = encode_image(image, output_format)
+    else:
+        buffer = BytesIO()
+        image.save(buffer, format=output_format)
+        data = buffer.getvalue()
+    write_file_atomic(output_path, data)
+
+
+class FreqImage:
+    """A rendered card whose representations are computed on first access and memoized.
+
+    Only the layout is computed up front; rasterizing, encoding and base64
+    happen when image, encoded/png_bytes, base64 or data_uri are first read.
+
+    Attributes :
+        layout : Layout of the card
+        output_format : format of encoded (the one actually used once a budgeted encoding ran)
+        budget : BudgetedEncoding of the last encoding when max_bytes is set, None otherwise
+        timer : StageTimer collecting the time of each computed representation, or None
+    """
+
+    def __init__(self, layout: Layout, output_format: str = "PNG", encode_options: dict = None,
+                 max_bytes: int = None, timer: StageTimer = None):
+        self.layout = layout
+        self.output_format = output_format.upper()
+        self.encode_options = encode_options
+        self.max_bytes = max_bytes
+        self.budget = None
+        self.timer = timer
+
+    @cached_property
+    def image(self) -> Image.Image:
+        """The rendered PIL image."""
+        return render_layout(self.layout, self.timer)
+
+    @cached_property
+    def encoded(self) -> bytes:
+        """The image encoded with output_format/encode_options (within max_bytes if set)."""
+        image = self.image
+        if self.timer:
+            self.timer.reset()
+        if self.max_bytes is None:
+            data = encode_image(image, self.output_format, self.encode_options)
+        else:
+            self.budget = encode_within_budget(image, self.max_bytes, self.output_format, self.encode_options)
+            self.output_format = self.budget.output_format
+            data = self.budget.data
+        if self.timer:
+            self.timer.mark('encode')
+        return data
+
+    @cached_property
+    def png_bytes(self) -> bytes:
+        """The image encoded as PNG, shared with encoded when that is already PNG."""
+        if self.max_bytes is None and self.output_format == "PNG":
+            return self.encoded
+        return encode_image(self.image, "PNG")
+
+    @cached_property
+    def base64(self) -> str:
+        """encoded as a base64 string."""
+        encoded = self.encoded
+        if self.timer:
+            self.timer.reset()
+        image_base64 = base64.b64encode(encoded).decode('utf-8')
+        if self.timer:
+            self.timer.mark('base64')
+        return image_base64
+
+    @property
+    def mime_type(self) -> str:
+        """MIME type of encoded."""
+        self.encoded  # a budgeted encoding may switch output_format
+        return OUTPUT_FORMATS[self.output_format]
+
+    @cached_property
+    def data_uri(self) -> str:
+        """encoded as a data: URI, ready for an <img> src."""
+        return f"data:{self.mime_type};base64,{self.base64}"
+
+    def save(self, output_path: str):
+        """Write the image to output_path, reusing encoded when the extension matches its format."""
+        image, encoded = self.image, self.encoded
+        if self.timer:
+            self.timer.reset()
+        save_output(image, output_path, encoded, self.output_format)
+        if self.timer:
+            self.timer.mark('write')
+
+
+def render_freq_image(frequency: str, scene_genre: str, scene_name: str,
+                      radio_station_name: str, verbatims: List[str], tags: List[str], artists: List[str],
+                      assets_dir: str = "assets", output_format: str = "PNG", encode_options: dict = None,
+                      max_bytes: int = None, seed: int = PILL_SHUFFLE_SEED,
+                      timer: StageTimer = None) -> FreqImage:
+    """
+    Comme generate_freq_image, mais retourne un FreqImage dont l'image, les octets encodés, le base64
+    et la data URI ne sont calculés qu'au premier accès. Si timer est fourni, chaque étape y est
+    chronométrée (à émettre avec timer.emit()).
+
+    Returns :
+        FreqImage : Image générée (représentations paresseuses et mémorisées)
+    """
+    layout = layout_freq_image(frequency, scene_genre, scene_name, radio_station_name,
+                               verbatims, tags, artists, assets_dir=assets_dir, seed=seed, timer=timer)
+    return FreqImage(layout, output_format, encode_options, max_bytes, timer)
+
+
+def generate_freq_image(frequency: str, scene_genre: str, scene_name: str, 
+                       radio_station_name: str, verbatims: List[str], tags: List[str], artists: List[str],
+                       output_path: str = None, assets_dir: str = "assets",
+                       output_format: str = "PNG", encode_options: dict = None,
+                       max_bytes: int = None, seed: int = PILL_SHUFFLE_SEED) -> str:
+    """
+    Génère une image, avec informations de fréquence, genre, nom de scène, radio et différents types de pills.
+
+    Arguments :
+        frequency : (str) Fréquence à afficher (ex: "97.3")
+        scene_genre : (str) Genre musical de la scène (ex: "House solaire")
+        scene_name : (str) Nom de la scène ("Le Refuge" ou "L'Atrium")
+        radio_station_name : (str) Nom de la radio ou de la programmation
+        verbatims : (List[str]) Liste de verbatims (fond gris)
+        tags : (List[str]) Liste de tags (fond blanc)
+        artists : (List[str]) Liste d'artistes (fond coloré selon la scène)
+        output_path : (str, optionnel) Chemin de sauvegarde de l'image générée. Si None, un nom par défaut est utilisé.
+        assets_dir : (str, optionnel) Dossier contenant les assets (images et polices). Par défaut "assets".
+        output_format : (str, optionnel) Format d'encodage : "PNG", "WEBP" ou "JPEG". Par défaut "PNG".
+        encode_options : (dict, optionnel) Options de l'encodeur (ex: {"compress_level": 1} pour PNG,
+            {"quality": 80} pour WEBP/JPEG, {"lossless": True} pour WEBP). Voir encode_image.
+        max_bytes : (int, optionnel) Taille maximale de l'image encodée. Si le format demandé est trop lourd,
+            la qualité WEBP puis JPEG est ajustée par dichotomie (voir encode_within_budget).
+        seed : (int, optionnel) Graine du mélange des pills. Par défaut 420. Le générateur aléatoire global
+            n'est pas modifié, la fonction peut donc être appelée depuis plusieurs threads.
+
+    Returns :
+        str : Image encodée en base64
+    """
+    # Per-stage timing, only when a sink is set (see set_timing_sink)
+    timer = start_timer()
+    result = render_freq_image(frequency, scene_genre, scene_name, radio_station_name,
+                               verbatims, tags, artists, assets_dir=assets_dir, output_format=output_format,
+                               encode_options=encode_options, max_bytes=max_bytes, seed=seed, timer=timer)
     
     # Optionally save to file if output_path is provided
     if output_path is not None:
-        image.save(output_path)
+        result.save(output_path)
     
+    image_base64 = result.base64
+    if timer:
+        timer.emit()
     return image_base64
 
 
@@ -0,0 +1,33 @@
+"""Pre-render every card of an event manifest into the on-disk render cache.
+
+Usage:
+    python warm_render_cache.py manifest.jsonl [--cache-dir DIR] [--max-size BYTES] [--assets-dir DIR]
+                                                [--workers N]
+
+The manifest has one JSON object of generate_freq_image arguments per line.
+"""
+import argparse
+import sys
+
+from freq_image_cache import DiskRenderCache, read_manifest, warm_cache
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("manifest", help="JSONL file of render specs")
+    parser.add_argument("--cache-dir", default="render_cache", help="DiskRenderCache directory")
+    parser.add_argument("--max-size", type=int, default=512 * 1024 * 1024, help="Cache size cap in bytes")
+    parser.add_argument("--assets-dir", default="assets",
+                        help="Assets directory of specs that do not set assets_dir (default: assets)")
+    parser.add_argument("--workers", type=int, default=None, help="Render processes (default: cores)")
+    args = parser.parse_args()
+
+    manifest_errors = {}
+    specs = read_manifest(args.manifest, errors=manifest_errors)
+    report = warm_cache(DiskRenderCache(args.cache_dir, args.max_size), specs, workers=args.workers,
+                        assets_dir=args.assets_dir, errors=manifest_errors)
+    print(f"{report['cards']} cards ({report['specs']} specs, {report['invalid']} invalid): "
+          f"{report['already_cached']} already cached, {report['rendered']} rendered, {report['failed']} failed")
+    print(f"Coverage {report['coverage']:.1%} in {report['seconds']:.2f} s")
+    for line_number, error in sorted(report['errors'].items()):
+        print(f"  {args.manifest}:{line_number}: {error}", file=sys.stderr)
+    sys.exit(1 if report['failed'] or report['invalid'] else 0)